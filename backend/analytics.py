@@ -0,0 +1,335 @@
+import bisect
+import logging
+from collections import deque
+from datetime import timedelta
+from functools import lru_cache
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+logger = logging.getLogger(__name__)
+
+# Trading month, quarter and year
+DEFAULT_WINDOWS = (20, 60, 250)
+# Stats are rounded so the batch and incremental paths produce identical digests
+DECIMALS = 6
+# A window whose standard deviation is below this (relative to its mean) has no z-score
+_FLAT = 1e-9
+
+
+def stat_columns(windows=DEFAULT_WINDOWS):
+    """Output columns, after date (and metric): value, mean_<w>/z_<w> per window, pct, last_year, doy_avg"""
+    columns = ['value']
+    for window in windows:
+        columns += [f'mean_{window}', f'z_{window}']
+    return columns + ['pct', 'last_year', 'doy_avg']
+
+
+@lru_cache(maxsize=1)
+def _day_keys():
+    """Sorted month * 100 + day keys of a non-leap year"""
+    lengths = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+    return np.asarray([month * 100 + day for month, days in enumerate(lengths, 1) for day in range(1, days + 1)])
+
+
+def _day_key(month, day):
+    """Calendar key for same-day-of-year lookups (arrays); Feb 29 shares Feb 28's key"""
+    return month * 100 + np.where((month == 2) & (day == 29), 28, day)
+
+
+def _finish(dates, columns, windows):
+    out = pd.DataFrame({'date': pd.DatetimeIndex(dates)})
+    for name in stat_columns(windows):
+        values = np.asarray(columns[name], dtype='float64')
+        out[name] = values if name in ('value', 'last_year') else values.round(DECIMALS)
+    return out
+
+
+def _day_of_year_table(dates, values):
+    """Values as of every calendar day (carried forward over non-trading days), by day key and year.
+
+    Returns (table, first year): table[key index, year - first year], NaN where
+    there is no value. Feb 29 is left out, so Feb 28's key keeps Feb 28's value.
+    """
+    calendar = pd.date_range(dates[0], dates[-1], freq='D')
+    daily = pd.Series(values, index=dates).reindex(calendar).ffill().to_numpy()
+    keep = ~((calendar.month == 2) & (calendar.day == 29))
+    calendar, daily = calendar[keep], daily[keep]
+    first_year = int(calendar.year.min())
+    table = np.full((len(_day_keys()), int(calendar.year.max()) - first_year + 1), np.nan)
+    table[np.searchsorted(_day_keys(), calendar.month * 100 + calendar.day), calendar.year - first_year] = daily
+    return table, first_year
+
+
+def rolling_stats(dates, values, windows=DEFAULT_WINDOWS):
+    """Statistics for a whole daily history in one vectorized pass.
+
+    `dates` must be ascending and unique, `values` finite. Per row:
+      mean_<w>, z_<w>  rolling mean over the last w rows and the row's z-score
+                       against it (sample std), NaN until w rows exist
+      pct              percent of all rows so far (this one included) at or below the value
+      last_year        value as of the same calendar day a year earlier (last trading day
+                       on or before it; Feb 29 compares with Feb 28)
+      doy_avg          average of that same-day-of-year value over every earlier year
+    """
+    dates = pd.DatetimeIndex(dates)
+    series = pd.Series(np.asarray(values, dtype='float64'), index=dates)
+    columns = {'value': series.to_numpy()}
+    if not len(series):
+        return _finish(dates, {name: [] for name in stat_columns(windows)}, windows)
+
+    for window in windows:
+        rolling = series.rolling(window, min_periods=window)
+        mean, std = rolling.mean(), rolling.std()
+        flat = std <= _FLAT * np.maximum(1.0, mean.abs())
+        columns[f'mean_{window}'] = mean.to_numpy()
+        columns[f'z_{window}'] = ((series - mean) / std.mask(flat)).to_numpy()
+    columns['pct'] = (series.expanding().rank(method='max', pct=True) * 100).to_numpy()
+
+    table, first_year = _day_of_year_table(dates, series.to_numpy())
+    sums = np.nancumsum(table, axis=1)
+    counts = np.cumsum(~np.isnan(table), axis=1)
+    rows = np.searchsorted(_day_keys(), _day_key(dates.month.to_numpy(), dates.day.to_numpy()))
+    previous = dates.year.to_numpy() - first_year - 1
+    has_previous = previous >= 0
+    prior_sum = np.where(has_previous, sums[rows, np.maximum(previous, 0)], 0.0)
+    prior_count = np.where(has_previous, counts[rows, np.maximum(previous, 0)], 0)
+    columns['last_year'] = np.where(has_previous, table[rows, np.maximum(previous, 0)], np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        columns['doy_avg'] = np.where(prior_count > 0, prior_sum / prior_count, np.nan)
+    return _finish(dates, columns, windows)
+
+
+class _SortedValues:
+    """Sorted multiset of floats in bounded buckets, with a Fenwick tree over the bucket sizes.
+
+    insert() and count_le() cost O(log n + bucket). copy() shares the
+    buckets copy-on-write, so it costs O(n / bucket).
+    """
+
+    def __init__(self, values=(), bucket=1024, presorted=False):
+        self.bucket = bucket
+        values = list(values) if presorted else sorted(values)
+        self.buckets = [values[i:i + bucket] for i in range(0, len(values), bucket)]
+        self.maxes = [b[-1] for b in self.buckets]
+        self.owned = [True] * len(self.buckets)  # False: shared with a copy, copy before changing
+        self.size = len(values)
+        self._build_tree()
+
+    def _build_tree(self):
+        tree = [0] * (len(self.buckets) + 1)
+        for i, bucket in enumerate(self.buckets, 1):
+            tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _count_before(self, i):
+        """Number of values in buckets[:i]"""
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def insert(self, value):
+        self.size += 1
+        if not self.buckets:
+            self.buckets, self.maxes, self.owned = [[value]], [value], [True]
+            self._build_tree()
+            return
+        i = min(bisect.bisect_left(self.maxes, value), len(self.buckets) - 1)
+        if not self.owned[i]:
+            self.buckets[i], self.owned[i] = list(self.buckets[i]), True
+        bucket = self.buckets[i]
+        bisect.insort(bucket, value)
+        if len(bucket) > 2 * self.bucket:
+            half = len(bucket) // 2
+            self.buckets[i:i + 1] = [bucket[:half], bucket[half:]]
+            self.maxes[i:i + 1] = [bucket[half - 1], bucket[-1]]
+            self.owned[i:i + 1] = [True, True]
+            self._build_tree()  # once per `bucket` inserts at most
+            return
+        self.maxes[i] = bucket[-1]
+        j = i + 1
+        while j < len(self.tree):
+            self.tree[j] += 1
+            j += j & -j
+
+    def count_le(self, value):
+        i = bisect.bisect_right(self.maxes, value)
+        below = self._count_before(i)
+        if i < len(self.buckets):
+            below += bisect.bisect_right(self.buckets[i], value)
+        return below
+
+    def copy(self):
+        other = _SortedValues(bucket=self.bucket)
+        other.buckets, other.maxes, other.tree = list(self.buckets), list(self.maxes), list(self.tree)
+        other.size = self.size
+        self.owned = [False] * len(self.buckets)
+        other.owned = list(self.owned)
+        return other
+
+    def values(self):
+        """All values in ascending order, as a float64 array"""
+        return np.fromiter((v for bucket in self.buckets for v in bucket), dtype='float64', count=self.size)
+
+
+class RollingStats:
+    """Incremental form of rolling_stats(), for appending a few rows to a long history.
+
+    Windows keep running sums (of values shifted by the first one, for
+    precision) over a ring of the last rows, percentiles a bucketed sorted
+    list, and same-day-of-year comparisons a running sum per calendar day key.
+    Each new row costs O(1), O(log n + bucket) for the percentile. Build one
+    from the history with `from_history` and feed new rows to `extend`; to
+    resume later without the history, keep a `copy` or persist `state` and
+    rebuild it with `from_state`.
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS):
+        self.windows = tuple(windows)
+        self.tail = deque(maxlen=max(self.windows))
+        self.shift = None
+        self.sums = {window: [0.0, 0.0] for window in self.windows}
+        self.sorted = _SortedValues()
+        self.days = {}   # day key -> [sum, count, year, value, previous year, previous value]
+        self.last = None  # (date, value) of the latest row, to fill the calendar days after it
+
+    @classmethod
+    def from_history(cls, dates, values, windows=DEFAULT_WINDOWS):
+        stats = cls(windows)
+        values = np.asarray(values, dtype='float64')
+        if not len(values):
+            return stats
+        dates = pd.DatetimeIndex(dates)
+        stats.shift = float(values[0])
+        stats.tail.extend((values[-stats.tail.maxlen:] - stats.shift).tolist())
+        stats._sum_windows()
+        stats.sorted = _SortedValues(values.tolist())
+
+        table, first_year = _day_of_year_table(dates, values)
+        present = ~np.isnan(table)
+        for row in np.flatnonzero(present.any(axis=1)):
+            years = np.flatnonzero(present[row])
+            entry = [float(np.nansum(table[row])), int(len(years)), first_year + int(years[-1]),
+                     float(table[row, years[-1]]), None, np.nan]
+            if len(years) > 1:
+                entry[4:] = [first_year + int(years[-2]), float(table[row, years[-2]])]
+            stats.days[int(_day_keys()[row])] = entry
+        stats.last = (dates[-1], float(values[-1]))
+        return stats
+
+    def _sum_windows(self):
+        """Window sums from the tail, so a rebuilt or copied state matches one built by from_history"""
+        tail = list(self.tail)
+        for window in self.windows:
+            recent = tail[-window:]
+            self.sums[window] = [sum(recent), sum(v * v for v in recent)]
+
+    def copy(self):
+        """Independent copy in O(window + calendar days + n / bucket); the sorted values are shared copy-on-write"""
+        other = type(self)(self.windows)
+        other.shift = self.shift
+        other.tail.extend(self.tail)
+        other._sum_windows()
+        other.sorted = self.sorted.copy()
+        other.days = {key: list(entry) for key, entry in self.days.items()}
+        other.last = self.last
+        return other
+
+    def state(self):
+        """(JSON-serializable state, all values so far sorted ascending) for from_state"""
+        return {
+            'windows': list(self.windows),
+            'shift': self.shift,
+            'tail': list(self.tail),
+            'days': {str(key): entry for key, entry in self.days.items()},
+            'last': [str(self.last[0].date()), self.last[1]] if self.last else None,
+        }, self.sorted.values()
+
+    @classmethod
+    def from_state(cls, state, sorted_values):
+        """Rebuild from state(), in O(n) without re-sorting or replaying the history"""
+        stats = cls(state['windows'])
+        stats.shift = state['shift']
+        stats.tail.extend(state['tail'])
+        stats._sum_windows()
+        stats.sorted = _SortedValues(np.asarray(sorted_values, dtype='float64').tolist(), presorted=True)
+        stats.days = {int(key): list(entry) for key, entry in state['days'].items()}
+        if state['last']:
+            stats.last = (pd.Timestamp(state['last'][0]), state['last'][1])
+        return stats
+
+    @staticmethod
+    def _key(day):
+        return day.month * 100 + (28 if day.month == 2 and day.day == 29 else day.day)
+
+    def _record_day(self, day, value):
+        if day.month == 2 and day.day == 29:
+            return  # Feb 28 holds this year's value for the shared key
+        entry = self.days.setdefault(self._key(day), [0.0, 0, None, np.nan, None, np.nan])
+        entry[0] += value
+        entry[1] += 1
+        entry[4:] = entry[2:4]
+        entry[2:4] = [day.year, value]
+
+    def _same_day(self, day):
+        entry = self.days.get(self._key(day))
+        if entry is None:
+            return np.nan, np.nan
+        total, count, year, value, previous_year, previous_value = entry
+        if year == day.year:  # Feb 29, after this year's Feb 28
+            total, count, year, value = total - value, count - 1, previous_year, previous_value
+        last_year = value if year == day.year - 1 else np.nan
+        return last_year, (total / count if count else np.nan)
+
+    def push(self, day, value):
+        """Add one row (after every row so far); returns its stats in stat_columns() order"""
+        if self.shift is None:
+            self.shift = value
+        if self.last is not None:
+            previous_day, previous_value = self.last
+            gap = previous_day + timedelta(days=1)
+            while gap < day:
+                self._record_day(gap, previous_value)
+                gap += timedelta(days=1)
+
+        shifted = value - self.shift
+        row = [value]
+        for window in self.windows:
+            sums = self.sums[window]
+            if len(self.tail) >= window:
+                dropped = self.tail[-window]
+                sums[0] -= dropped
+                sums[1] -= dropped * dropped
+            sums[0] += shifted
+            sums[1] += shifted * shifted
+            count = min(len(self.tail) + 1, window)
+            if count < window:
+                row += [np.nan, np.nan]
+                continue
+            mean = sums[0] / window
+            std = max(0.0, (sums[1] - sums[0] * mean) / (window - 1)) ** 0.5
+            mean += self.shift
+            row += [mean, (value - mean) / std if std > _FLAT * max(1.0, abs(mean)) else np.nan]
+        self.tail.append(shifted)
+
+        self.sorted.insert(value)
+        row.append(100.0 * self.sorted.count_le(value) / self.sorted.size)
+        row += self._same_day(day)
+        self._record_day(day, value)
+        self.last = (day, value)
+        return row
+
+    def extend(self, dates, values):
+        """Stats for rows appended after the history, as a frame like rolling_stats()"""
+        dates = pd.DatetimeIndex(dates)
+        rows = [self.push(day, float(value)) for day, value in zip(dates, values)]
+        matrix = np.asarray(rows, dtype='float64').reshape(len(rows), len(stat_columns(self.windows)))
+        return _finish(dates, dict(zip(stat_columns(self.windows), matrix.T)), self.windows)
+
@@ -1,27 +1,160 @@
-
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request, send_file, url_for
 from data_engine import DataEngine
+from jobs import JobManager
+from metrics import REGISTRY
+from store import SeriesStore
 from dotenv import load_dotenv
 import os
+import threading
 
 # Load env from parent directory if needed, or current
 load_dotenv()
 
 app = Flask(__name__)
 
+# Sync runs happen on a background worker; one worker keeps runs from overlapping
+jobs = JobManager(max_workers=int(os.environ.get('SYNC_JOB_WORKERS', 1)))
+
+# In-memory, date-indexed copy of series/spreads for the read endpoints
+store = SeriesStore()
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Shared DataEngine so connection pools and caches stay warm between runs"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = DataEngine()
+            _engine.subscribers.append(store.update)
+        return _engine
+
+
+def get_store():
+    if not store.loaded:
+        store.load(get_engine())
+    return store
+
+
 @app.route('/')
 def home():
     return jsonify({"status": "online", "service": "DataView Backend"})
 
 @app.route('/refresh', methods=['POST', 'GET'])
 def refresh_data():
+    """Queue a sync job and return its id; concurrent refreshes join the running job"""
     try:
-        engine = DataEngine()
-        result = engine.sync_data()
-        return jsonify(result)
+        rebuild = request.args.get('rebuild', '').lower() in ('1', 'true', 'yes')
+        engine = get_engine()
+        job, created = jobs.submit(
+            'rebuild' if rebuild else 'sync',
+            lambda progress: engine.sync_data(rebuild=rebuild, progress=progress),
+            coalesce_key=('sync', rebuild),
+        )
+        status_url = url_for('job_status', job_id=job['id'])
+        body = {"status": job['status'], "job_id": job['id'], "coalesced": not created, "status_url": status_url}
+        return jsonify(body), 202, {'Location': status_url}
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/jobs')
+def list_jobs():
+    return jsonify(jobs.list())
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+    return jsonify(job)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: sync stage spans, per-source fetches, HTTP and upload counters"""
+    REGISTRY.set('dataview_jobs', sum(1 for j in jobs.list() if j['status'] in ('queued', 'running')),
+                 help='Sync jobs queued or running')
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/series')
+def list_series():
+    return jsonify(get_store().datasets())
+
+@app.route('/api/series/<name>')
+def read_series(name):
+    """Serve a dataset over ?start=&end= (YYYY-MM-DD) as columnar JSON, or ?format=records"""
+    fmt = request.args.get('format', 'columnar')
+    if fmt not in ('columnar', 'records'):
+        return jsonify({"status": "error", "message": "format must be columnar or records"}), 400
+    try:
+        rendered = get_store().render(name, request.args.get('start'), request.args.get('end'), fmt)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Bad date range: {e}"}), 400
+    if rendered is None:
+        return jsonify({"status": "error", "message": f"Unknown dataset {name}"}), 404
+
+    body, compressed, etag = rendered
+    REGISTRY.inc('dataview_api_responses_total', help='Read API responses by dataset and format',
+                 dataset=name, format=fmt)
+    headers = {'Cache-Control': 'public, max-age=60', 'Vary': 'Accept-Encoding'}
+    if compressed is not None and 'gzip' in request.accept_encodings:
+        # Each representation gets its own strong ETag, so caches can hold both
+        headers['Content-Encoding'] = 'gzip'
+        body, etag = compressed, f"{etag}-gz"
+    if request.if_none_match.contains(etag):
+        headers.pop('Content-Encoding', None)
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/crush-margins')
+def read_crush_margins():
+    return read_series('crush_margins')
+
+@app.route('/api/crush-margins/stats/<metric>')
+def read_crush_margin_stats(metric):
+    """Rolling means, z-scores, percentile and same-day-of-year values of one margin column, precomputed at sync"""
+    return read_series(f'crush_margin_stats.{metric}')
+
+SNAPSHOT_MIMETYPES = {'parquet': 'application/vnd.apache.parquet', 'arrow': 'application/vnd.apache.arrow.file'}
+
+@app.route('/api/snapshots')
+def list_snapshots():
+    snapshots = get_engine().snapshots
+    if snapshots is None:
+        return jsonify({})
+    return jsonify({name: snapshots.latest(name)['version'] for name in snapshots.datasets()})
+
+@app.route('/api/snapshots/<dataset>')
+def snapshot_manifest(dataset):
+    """Latest snapshot manifest: version, date range, files, and the byte range of each year's Arrow batch"""
+    snapshots = get_engine().snapshots
+    manifest = snapshots.latest(dataset) if snapshots else None
+    if manifest is None:
+        return jsonify({"status": "error", "message": f"No snapshot of {dataset}"}), 404
+    manifest['urls'] = {kind: url_for('snapshot_file', dataset=dataset, version=manifest['version'],
+                                      filename=entry['path'])
+                        for kind, entry in manifest['files'].items()}
+    response = jsonify(manifest)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(f"{dataset}-{manifest['version']}")
+    return response.make_conditional(request)
+
+@app.route('/api/snapshots/<dataset>/<int:version>/<filename>')
+def snapshot_file(dataset, version, filename):
+    """One file of a snapshot version; versions never change, so Range requests and long caching are safe"""
+    snapshots = get_engine().snapshots
+    path = snapshots.file_path(dataset, version, filename) if snapshots else None
+    if path is None:
+        return jsonify({"status": "error", "message": f"Unknown snapshot file {dataset}/{version}/{filename}"}), 404
+    kind = 'parquet' if filename.endswith('.parquet') else 'arrow'
+    REGISTRY.inc('dataview_snapshot_responses_total', help='Snapshot file responses by dataset and format',
+                 dataset=dataset, format=kind)
+    return send_file(path, mimetype=SNAPSHOT_MIMETYPES[kind], conditional=True, max_age=365 * 24 * 3600)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
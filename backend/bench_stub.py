@@ -0,0 +1,268 @@
+"""Local stand-in for Sina, Jiaoyifamen and Supabase PostgREST, for offline benchmarks.
+
+Upstream payloads are replayed from recorded fixtures when present
+(sina_<symbol>.txt / jiaoyifamen_<kind>.json in the fixtures directory),
+otherwise generated on the fly. Generated history size is picked per request
+by a /n/<rows> path prefix, so one stub serves every benchmark size:
+
+    SINA_BASE_URL=http://127.0.0.1:PORT/n/100000
+    JIAOYIFAMEN_BASE_URL=http://127.0.0.1:PORT/n/100000
+    NEXT_PUBLIC_SUPABASE_URL=http://127.0.0.1:PORT
+
+PostgREST reads return an empty table and upserts are acknowledged (201)
+after the body is read; GET /_stats reports the rows and bytes received.
+
+Usage:
+    python bench_stub.py serve [--port 8765] [--fixtures DIR] [--max-body BYTES]
+    python bench_stub.py record DIR     # save live payloads for every registered series
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+import subprocess
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+import pandas as pd
+
+HISTORY_END = np.datetime64('2025-12-31', 'D')
+# Daily rows that fit before HISTORY_END in datetime64[ns]; longer histories wrap around
+MAX_HISTORY_DAYS = int((HISTORY_END - np.datetime64(pd.Timestamp.min.ceil('D').date(), 'D')).astype(np.int64))
+
+BASE_PRICES = {'Y': 8000.0, 'M': 3200.0, 'B0': 4000.0, 'P0': 7500.0, 'OI0': 9000.0}
+
+_PREFIX = re.compile(r'^/n/(\d+)(/.*)$')
+
+
+def history_dates(n):
+    """`n` consecutive daily dates ending at HISTORY_END (repeating past MAX_HISTORY_DAYS)"""
+    offsets = (n - 1 - np.arange(n, dtype=np.int64)) % MAX_HISTORY_DAYS
+    return HISTORY_END - offsets.astype('timedelta64[D]')
+
+
+def _seed(symbol):
+    return sum(symbol.encode('utf-8'))
+
+
+def sina_payload(n, symbol='B0'):
+    """Sina JSONP daily K-line body with `n` rows, as returned by InnerFuturesNewService"""
+    rng = np.random.default_rng(_seed(symbol))
+    dates = np.datetime_as_string(history_dates(n), unit='D').astype(object)
+    close = rng.normal(BASE_PRICES.get(symbol, 4000.0), 300, n).round(0).astype(np.int64)
+    volume = (100 + np.arange(n) % 900).astype(str).astype(object)
+    rows = ('{"d":"' + dates + '","o":"' + (close - 10).astype(str).astype(object)
+            + '","h":"' + (close + 20).astype(str).astype(object)
+            + '","l":"' + (close - 25).astype(str).astype(object)
+            + '","c":"' + close.astype(str).astype(object)
+            + '","v":"' + volume + '","p":"0","s":"0"}')
+    body = ','.join(rows.tolist())
+    return f'/*<script>location.href=\'//sina.com\';</script>*/\nvar _{symbol}=([{body}]);'.encode('utf-8')
+
+
+def jiaoyifamen_payload(n, kind='Y', short_dates=False):
+    """Jiaoyifamen future-basis JSON with `n` points.
+
+    The live API labels points MM-DD, which only spans one year once the year
+    is inferred; short_dates=False emits YYYY-MM-DD so long histories stay unique.
+    """
+    rng = np.random.default_rng(_seed(kind))
+    labels = np.datetime_as_string(history_dates(n), unit='D')
+    if short_dates:
+        labels = np.asarray([label[5:] for label in labels.tolist()])
+    return json.dumps({"code": 0, "data": {
+        "category": labels.tolist(),
+        "futuresPrice": rng.normal(BASE_PRICES.get(kind, 8000.0), 500, n).round(0).tolist(),
+        "basisValue": rng.normal(200, 50, n).round(0).tolist(),
+    }}).encode('utf-8')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _route(self):
+        parts = urlsplit(self.path)
+        rows = self.server.default_rows
+        path = parts.path
+        match = _PREFIX.match(path)
+        if match:
+            rows, path = int(match.group(1)), match.group(2)
+        return path, parse_qs(parts.query), rows
+
+    def do_GET(self):
+        path, query, rows = self._route()
+        if 'getDailyKLine' in path:
+            symbol = query.get('symbol', ['B0'])[0]
+            return self._send(200, self.server.payload('sina', symbol, rows), 'application/javascript')
+        if path.endswith('/future-basis/query'):
+            kind = query.get('type', ['Y'])[0]
+            return self._send(200, self.server.payload('jiaoyifamen', kind, rows))
+        if path.startswith('/rest/v1/'):
+            return self._send(200, b'[]')
+        if path == '/_stats':
+            with self.server.lock:
+                return self._send(200, json.dumps(self.server.stats).encode('utf-8'))
+        self._send(404)
+
+    def do_POST(self):
+        path, _, _ = self._route()
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if path == '/_reset':
+            with self.server.lock:
+                self.server.stats.clear()
+            return self._send(204)
+        if not path.startswith('/rest/v1/'):
+            return self._send(404)
+        table = path.rsplit('/', 1)[-1]
+        if self.server.max_body and length > self.server.max_body:
+            return self._send(413, b'{"message":"Payload Too Large"}')
+        rows = body.count(b'},{') + 1 if len(body) > 2 else 0
+        with self.server.lock:
+            stats = self.server.stats.setdefault(table, {'requests': 0, 'rows': 0, 'bytes': 0})
+            stats['requests'] += 1
+            stats['rows'] += rows
+            stats['bytes'] += length
+        self._send(201)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, fixtures=None, default_rows=1000, max_body=None, keep=8):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.fixtures = fixtures
+        self.default_rows = default_rows
+        self.max_body = max_body
+        self.stats = {}
+        self.lock = threading.Lock()
+        self._payloads = OrderedDict()
+        self._keep = keep
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def payload(self, source, symbol, rows):
+        """Recorded fixture if there is one, else a generated payload (memoized, LRU)"""
+        key = (source, symbol, rows)
+        with self.lock:
+            if key in self._payloads:
+                self._payloads.move_to_end(key)
+                return self._payloads[key]
+        body = self._fixture(source, symbol)
+        if body is None:
+            body = sina_payload(rows, symbol) if source == 'sina' else jiaoyifamen_payload(rows, symbol)
+        with self.lock:
+            self._payloads[key] = body
+            while len(self._payloads) > self._keep:
+                self._payloads.popitem(last=False)
+        return body
+
+    def _fixture(self, source, symbol):
+        if not self.fixtures:
+            return None
+        path = os.path.join(self.fixtures, f"{source}_{symbol}.{'txt' if source == 'sina' else 'json'}")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+class StubProcess:
+    """Run the stub in a child process (so it doesn't share the GIL with the code under test)"""
+
+    def __init__(self, fixtures=None, max_body=None):
+        self.args = [sys.executable, os.path.abspath(__file__), 'serve', '--port', '0']
+        if fixtures:
+            self.args += ['--fixtures', fixtures]
+        if max_body:
+            self.args += ['--max-body', str(max_body)]
+        self.proc = None
+        self.url = None
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(self.args, stdout=subprocess.PIPE, text=True)
+        line = self.proc.stdout.readline().strip()
+        if not line.startswith('http://'):
+            self.proc.kill()
+            raise RuntimeError(f"Benchmark stub failed to start: {line!r}")
+        self.url = line
+        return self
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        self.proc.wait(timeout=10)
+
+    def base_urls(self, rows):
+        """Environment pointing DataEngine at this stub with `rows` of generated history"""
+        upstream = f"{self.url}/n/{rows}"
+        return {'SINA_BASE_URL': upstream, 'JIAOYIFAMEN_BASE_URL': upstream, 'NEXT_PUBLIC_SUPABASE_URL': self.url}
+
+
+def record(directory):
+    """Save one live payload per registered series as a replayable fixture"""
+    from data_engine import DataEngine
+
+    os.makedirs(directory, exist_ok=True)
+    engine = DataEngine(supabase_url='http://127.0.0.1', supabase_key='unused', cache=False)
+    for series in engine.registry.series:
+        source, symbol = series['source'], series['symbol']
+        if source == 'sina':
+            url, headers = engine.sina_request(symbol)
+            params, ext = None, 'txt'
+        elif source == 'jiaoyifamen':
+            url, headers, params = engine.jiaoyifamen_request(symbol)
+            ext = 'json'
+        else:
+            continue
+        response = engine.http.get(url, headers=headers, params=params, timeout=engine.fetch_timeout)
+        if not response.ok:
+            print(f"{source}/{symbol}: HTTP {response.status}, skipped", file=sys.stderr)
+            continue
+        path = os.path.join(directory, f"{source}_{symbol}.{ext}")
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        print(f"{source}/{symbol}: {len(response.content)} bytes -> {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('serve')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--fixtures', help='directory of recorded payloads to replay')
+    p.add_argument('--rows', type=int, default=1000, help='generated history size without a /n/<rows> prefix')
+    p.add_argument('--max-body', type=int, help='answer 413 to upserts larger than this many bytes')
+    p = sub.add_parser('record')
+    p.add_argument('directory')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.directory)
+        return
+    server = StubServer(args.port, args.fixtures, args.rows, args.max_body)
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,523 @@
+"""Offline benchmarks for the DataEngine pipeline.
+
+Nothing here talks to Sina, Jiaoyifamen or Supabase: `suite` runs against
+bench_stub.py (recorded fixtures or generated payloads, plus a PostgREST
+stand-in), each case in a fresh process so peak RSS is per case.
+
+Usage:
+    python benchmarks.py serialize [--sizes 1000,100000,1000000] [--legacy-max 100000]
+    python benchmarks.py parse [--sizes 1000,100000,1000000] [--legacy-max 1000000]
+    python benchmarks.py suite [--sizes 1000,10000,100000,1000000] [--stages sync,fetch,...]
+                               [--repeat 3] [--fixtures DIR] [--out results.json]
+    python benchmarks.py compare base.json new.json [--threshold 0.2]
+    python benchmarks.py startup [--budget-ms 400] [--runs 5]   # exits 1 over budget
+    python benchmarks.py scaling [--contracts 200] [--rows 5000] [--workers 1,2,4,<cpus>] [--repeat 3]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data_engine import CRUSH_MARGIN_COLUMNS, DataEngine, serialize_records
+from metrics import RunTrace
+from registry import Registry
+from parsers import SinaKlineParser, parse_jiaoyifamen, to_frame
+from series_cache import SeriesCache
+from bench_stub import StubProcess, history_dates, sina_payload, jiaoyifamen_payload
+
+SUITE_STAGES = ['sync', 'fetch', 'parse', 'merge', 'compute', 'analytics', 'serialize', 'upload']
+
+# Entry points whose import must stay cheap, and dependencies they must not load eagerly
+STARTUP_TARGETS = ['app', 'schedule_runner', 'data_engine']
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'requests', 'supabase']
+
+
+def synthetic_margins(n, seed=0):
+    """Merged crush-margin frame with `n` consecutive daily rows and a few NaNs"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'date': history_dates(n).astype('datetime64[ns]'),
+        'soybean_oil_price': rng.normal(8000, 500, n).round(0),
+        'soybean_meal_price': rng.normal(3200, 200, n).round(0),
+        'soybean_no2_price': rng.normal(4000, 300, n).round(0),
+        'oil_basis': rng.normal(200, 50, n).round(0),
+        'meal_basis': rng.normal(50, 30, n).round(0),
+    })
+    df.loc[df.index[::97], 'meal_basis'] = np.nan
+    df['gross_margin'] = rng.normal(100, 80, n)
+    df['futures_margin'] = rng.normal(60, 80, n)
+    df['oil_meal_ratio'] = rng.normal(2.5, 0.2, n)
+    return df
+
+
+def legacy_serialize(df):
+    """The iterrows() serializer sync_data used before serialize_records"""
+    records = []
+    for _, row in df.iterrows():
+        row = row.where(pd.notnull(row), None)
+        records.append(json.dumps({
+            'date': row['date'].strftime('%Y-%m-%d'),
+            'soybean_oil_price': row['soybean_oil_price'],
+            'soybean_meal_price': row['soybean_meal_price'],
+            'soybean_no2_price': row['soybean_no2_price'],
+            'oil_basis': row['oil_basis'],
+            'meal_basis': row['meal_basis'],
+            'gross_margin': row['gross_margin'],
+            'futures_margin': row['futures_margin'],
+            'oil_meal_ratio': row['oil_meal_ratio'],
+            'updated_at': datetime.now().isoformat()
+        }))
+    return records
+
+
+def legacy_parse_sina(text):
+    """The find('[')/json.loads/DataFrame(list of dicts) parser used before parsers.py"""
+    first_bracket = text.find('[')
+    last_bracket = text.rfind(']')
+    data = json.loads(text[first_bracket:last_bracket + 1])
+    df = pd.DataFrame(data)
+    df = df.rename(columns={'d': 'date', 'c': 'close'})
+    df['date'] = pd.to_datetime(df['date'])
+    df['close'] = pd.to_numeric(df['close'])
+    return df[['date', 'close']].sort_values('date')
+
+
+def legacy_parse_jiaoyifamen(text):
+    """The per-row loop with MM-DD rewriting used before parsers.py"""
+    raw_data = json.loads(text).get('data', {})
+    keys = list(raw_data.keys())
+    cat_key = next((k for k in keys if 'category' in k.lower()), None)
+    price_key = next((k for k in keys if 'price' in k.lower()), None)
+    basis_key = next((k for k in keys if 'basis' in k.lower()), None)
+    dates, prices, bases = raw_data[cat_key], raw_data[price_key], raw_data[basis_key]
+    result = []
+    current_date = datetime.now()
+    for i in range(min(len(dates), len(prices), len(bases))):
+        d_str = dates[i]
+        if '-' in d_str and len(d_str) <= 5:
+            m, d = map(int, d_str.split('-'))
+            year = current_date.year - 1 if current_date.month < m else current_date.year
+            d_str = f"{year}-{m:02d}-{d:02d}"
+        result.append({'date': d_str, 'price': float(prices[i]), 'basis': float(bases[i])})
+    df = pd.DataFrame(result)
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    return df.dropna().sort_values('date')
+
+
+def new_parse_sina(payload, chunk_size=64 * 1024):
+    """Feed the payload in network-sized chunks, like fetch_sina_futures does"""
+    parser = SinaKlineParser()
+    for i in range(0, len(payload), chunk_size):
+        parser.feed(payload[i:i + chunk_size])
+    dates, closes = parser.finish()
+    return to_frame(dates, close=closes)
+
+
+def new_parse_jiaoyifamen(payload):
+    dates, price, basis = parse_jiaoyifamen(payload)
+    return to_frame(dates, price=price, basis=basis)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def bench_serialize(sizes, legacy_max):
+    results = []
+    for n in sizes:
+        df = synthetic_margins(n)
+        rows, elapsed = timed(serialize_records, df, CRUSH_MARGIN_COLUMNS)
+        result = {"size": n, "vectorized_rows_per_sec": round(n / elapsed), "vectorized_sec": round(elapsed, 4)}
+        if n <= legacy_max:
+            _, legacy = timed(legacy_serialize, df)
+            result.update({"legacy_rows_per_sec": round(n / legacy), "legacy_sec": round(legacy, 4),
+                           "speedup": round(legacy / elapsed, 1)})
+        results.append(result)
+    return results
+
+
+def measured(fn, *args):
+    """(result, seconds, peak traced MiB); tracing slows allocation, so it gets its own run"""
+    out, elapsed = timed(fn, *args)
+    tracemalloc.start()
+    try:
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return out, elapsed, round(peak / 2**20, 2)
+
+
+def bench_parse(sizes, legacy_max):
+    """Streaming/vectorized parsers vs the old ones on synthetic payloads"""
+    results = []
+    cases = [
+        ('sina', sina_payload, new_parse_sina, lambda p: legacy_parse_sina(p.decode('utf-8'))),
+        ('jiaoyifamen', lambda n: jiaoyifamen_payload(n, short_dates=True), new_parse_jiaoyifamen,
+         legacy_parse_jiaoyifamen),
+    ]
+    for name, make_payload, new, legacy in cases:
+        for n in sizes:
+            payload = make_payload(n)
+            df, elapsed, peak = measured(new, payload)
+            result = {"parser": name, "size": n, "payload_mb": round(len(payload) / 2**20, 2),
+                      "new_sec": round(elapsed, 4), "new_peak_mb": peak}
+            if n <= legacy_max:
+                old_df, legacy_elapsed, legacy_peak = measured(legacy, payload)
+                assert len(old_df) == len(df), f"{name}: parsers disagree ({len(old_df)} vs {len(df)} rows)"
+                result.update({"legacy_sec": round(legacy_elapsed, 4), "legacy_peak_mb": legacy_peak,
+                               "speedup": round(legacy_elapsed / elapsed, 1)})
+            results.append(result)
+    return results
+
+
+def synthetic_series(n, registry):
+    """Parsed-equivalent frames for every registered series, `n` rows each"""
+    days = history_dates(n).astype(np.int64)
+    frames = {}
+    for series in registry.series:
+        rng = np.random.default_rng(sum(series['key'].encode('utf-8')))
+        if series['source'] == 'sina':
+            frames[series['key']] = to_frame(days, close=rng.normal(4000, 300, n).round(0))
+        else:
+            frames[series['key']] = to_frame(days, price=rng.normal(8000, 500, n).round(0),
+                                             basis=rng.normal(200, 50, n).round(0))
+    return frames
+
+
+def synthetic_universe(contracts, n):
+    """Registry and frames for `contracts` per-contract series of `n` rows each.
+
+    Every contract writes its close to futures_price and feeds a calendar
+    spread against the previous contract, like a strip of Y2505, Y2509, ...
+    """
+    config = {'tables': Registry.load().tables, 'series': [], 'spreads': []}
+    days = history_dates(n).astype(np.int64)
+    frames = {}
+    for i in range(contracts):
+        key = f"C{i:04d}"
+        config['series'].append({
+            'key': key, 'source': 'sina', 'symbol': key,
+            'writes': [{'table': 'futures_price', 'key': {'symbol': key}, 'columns': {'close_price': 'close'}}],
+        })
+        if i:
+            config['spreads'].append({'name': f"{key}_calendar", 'table': 'spread_data',
+                                      'key': {'name': f"{key}_calendar"},
+                                      'columns': {'value': f"{key}_close - C{i - 1:04d}_close"}})
+        rng = np.random.default_rng(i)
+        frames[key] = to_frame(days, close=rng.normal(4000, 300, n).round(0))
+    return Registry(config), frames
+
+
+def bench_scaling(contracts, n, workers_list, repeat):
+    """Merge+compute throughput of a many-contract universe by shard worker count.
+
+    1 worker is the single-process path; the others go through the process
+    pool (workers are started before timing, as in a resident daemon).
+    Speedup and efficiency are relative to the first entry of `workers_list`;
+    entries with more workers than CPUs are flagged oversubscribed, since
+    they measure sharding overhead rather than scaling.
+    """
+    registry, frames = synthetic_universe(contracts, n)
+    plans = [(output, 'full', None) for output in registry.outputs]
+    results, baseline = [], None
+    for workers in workers_list:
+        engine = DataEngine(supabase_url='http://127.0.0.1:9', supabase_key='bench', cache=False,
+                            registry=registry, shards=workers)
+        try:
+            computed = engine._compute_plans(plans, frames, [], RunTrace('bench'))  # warm-up
+            rows = sum(len(df) for _, _, df in computed)
+            best = min(timed(engine._compute_plans, plans, frames, [], RunTrace('bench'))[1] for _ in range(repeat))
+        finally:
+            engine.close()
+        baseline = baseline or best
+        results.append({
+            "workers": workers, "contracts": contracts, "outputs": len(plans), "rows": rows,
+            "seconds": round(best, 4), "rows_per_sec": round(rows / best) if best else None,
+            "speedup": round(baseline / best, 2), "efficiency": round(baseline / best / workers, 2),
+            "cpus": os.cpu_count(), "oversubscribed": workers > (os.cpu_count() or 1),
+        })
+        print(f"{workers:>4} workers: {best:.3f}s" + (" (more workers than CPUs)" if results[-1]["oversubscribed"] else ""),
+              file=sys.stderr)
+    return results
+
+
+def _max_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KiB on Linux
+
+
+def _setup_case(stage, n, workdir):
+    """Build inputs for one stage outside the timed region; returns (fn, rows, bytes)"""
+    cache = SeriesCache(root=workdir, ttl=0) if stage == 'sync' else False
+    engine = DataEngine(supabase_key='bench', cache=cache)
+    if stage == 'sync':
+        def run():
+            result = engine.sync_data(rebuild=True)
+            if result['status'] != 'success':
+                raise RuntimeError(f"sync_data returned {result['status']}: {result.get('message')}")
+        return run, n, None
+    if stage == 'fetch':
+        def run():
+            frames, _ = engine.fetch_series()
+            empty = [key for key, df in frames.items() if df.empty]
+            if empty:
+                raise RuntimeError(f"fetch failed for {', '.join(empty)}")
+        return run, n * len(engine.registry.series), None
+    if stage == 'parse':
+        payload = sina_payload(n)
+        return (lambda: new_parse_sina(payload)), n, len(payload)
+    if stage == 'merge':
+        frames = synthetic_series(n, engine.registry)
+        return (lambda: engine.build_wide_frame(frames)), n * len(frames), None
+    if stage == 'compute':
+        wide = engine.build_wide_frame(synthetic_series(n, engine.registry))
+        output = engine.registry.output('crush_margins')
+        return (lambda: engine.compute_output(output, wide)), len(wide), None
+    if stage == 'analytics':
+        wide = engine.build_wide_frame(synthetic_series(n, engine.registry))
+        output = engine.registry.output('crush_margin_stats')
+        return (lambda: engine.compute_output(output, wide)), len(wide) * len(output['columns']), None
+    if stage == 'serialize':
+        df = synthetic_margins(n)
+        return (lambda: serialize_records(df, CRUSH_MARGIN_COLUMNS)), n, None
+    if stage == 'upload':
+        records = serialize_records(synthetic_margins(n), CRUSH_MARGIN_COLUMNS)
+        return (lambda: engine.upsert_records('crush_margins', records)), n, sum(len(r) for r in records)
+    raise ValueError(f"Unknown stage {stage}")
+
+
+def run_case(stage, n, env, repeat):
+    """Run one (stage, size) case; meant to be called in a fresh process"""
+    os.environ.update(env)
+    logging.disable(logging.INFO)  # per-fetch/per-batch info logs would dominate small sizes
+    with tempfile.TemporaryDirectory(prefix='dataview-bench-') as workdir:
+        fn, rows, nbytes = _setup_case(stage, n, workdir)
+        setup_rss = _max_rss_mb()
+        times = [timed(fn)[1] for _ in range(repeat)]
+    best = min(times)
+    result = {
+        "stage": stage, "size": n, "rows": rows, "repeat": repeat,
+        "seconds": round(best, 4), "median_seconds": round(float(np.median(times)), 4),
+        "rows_per_sec": round(rows / best) if best else None,
+        "setup_rss_mb": setup_rss, "peak_rss_mb": _max_rss_mb(),
+    }
+    if nbytes:
+        result["mb_per_sec"] = round(nbytes / 2**20 / best, 1) if best else None
+    return result
+
+
+def environment():
+    """Where a suite ran, so result files from different versions can be compared"""
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        rev = None
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_rev": rev,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def bench_suite(sizes, stages, repeat, fixtures=None):
+    """End-to-end and per-stage cases against the local stub; returns {"meta", "results"}"""
+    results = []
+    spawn = multiprocessing.get_context('spawn')
+    with StubProcess(fixtures=fixtures) as stub:
+        for n in sizes:
+            env = {**stub.base_urls(n), 'DATAVIEW_CACHE': '0'}
+            for stage in stages:
+                with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                    try:
+                        result = pool.submit(run_case, stage, n, env, repeat).result()
+                    except Exception as e:
+                        result = {"stage": stage, "size": n, "error": str(e)}
+                print(f"{stage:>10} {n:>10}: {result.get('seconds', result.get('error'))}", file=sys.stderr)
+                results.append(result)
+    return {"meta": {**environment(), "fixtures": fixtures, "repeat": repeat}, "results": results}
+
+
+def compare(base, new, threshold):
+    """Per-case slowdown of `new` vs `base`; returns (rows, regressions)"""
+    baseline = {(r['stage'], r['size']): r for r in base['results'] if 'seconds' in r}
+    rows, regressions = [], []
+    for r in new['results']:
+        old = baseline.get((r['stage'], r['size']))
+        if old is None or 'seconds' not in r:
+            continue
+        ratio = r['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        row = {"stage": r['stage'], "size": r['size'], "base_sec": old['seconds'], "new_sec": r['seconds'],
+               "time_change": f"{ratio - 1:+.1%}",
+               "base_rss_mb": old.get('peak_rss_mb'), "new_rss_mb": r.get('peak_rss_mb')}
+        rows.append(row)
+        if ratio > 1 + threshold:
+            regressions.append(row)
+    return rows, regressions
+
+
+def _import_in_subprocess(module, importtime=False):
+    """Import `module` in a fresh interpreter (cwd: a temp dir, so no sync.log lands in the repo).
+
+    Returns (wall seconds, -X importtime stderr or '').
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')]))}
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', f'import {module}']
+    with tempfile.TemporaryDirectory(prefix='dataview-startup-') as cwd:
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {proc.stderr.strip()[-500:]}")
+    return elapsed, proc.stderr if importtime else ''
+
+
+def parse_importtime(stderr, module):
+    """(cumulative import µs of `module`, set of every module imported) from -X importtime output"""
+    cumulative, imported = None, set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cum, name = line[len('import time:'):].split('|')
+        if not cum.strip().isdigit():
+            continue  # header line
+        imported.add(name.strip())
+        if name.rstrip() == f' {module}':
+            cumulative = int(cum)
+    return cumulative, imported
+
+
+def bench_startup(targets, runs, budget_ms):
+    """Cold-start import cost of each entry point; best of `runs` fresh interpreters"""
+    results = []
+    for module in targets:
+        walls, imports, heavy = [], [], set()
+        for _ in range(runs):
+            walls.append(_import_in_subprocess(module)[0])
+            cumulative, imported = parse_importtime(_import_in_subprocess(module, importtime=True)[1], module)
+            imports.append(cumulative / 1000)
+            heavy |= {m for m in HEAVY_MODULES if m in imported}
+        import_ms = round(min(imports), 1)
+        results.append({
+            "target": module, "import_ms": import_ms, "wall_ms": round(min(walls) * 1000, 1),
+            "heavy_loaded": ','.join(sorted(heavy)) or None, "budget_ms": budget_ms,
+            "ok": import_ms <= budget_ms and not heavy,
+        })
+    return results
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_table(results):
+    keys = list(dict.fromkeys(k for r in results for k in r))
+    print("  ".join(f"{k:>24}" for k in keys))
+    for r in results:
+        print("  ".join(f"{str(r.get(k, '-')):>24}" for k in keys))
+
+
+def parse_sizes(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--json', action='store_true', help='print machine-readable JSON instead of a table')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('serialize', help='upload payload serialization (rows/sec)')
+    p.add_argument('--sizes', type=parse_sizes, default=[1_000, 100_000, 1_000_000])
+    p.add_argument('--legacy-max', type=int, default=100_000,
+                   help='largest size to also run the old iterrows serializer on')
+
+    p = sub.add_parser('parse', help='upstream payload parsing (time and peak memory)')
+    p.add_argument('--sizes', type=parse_sizes, default=[1_000, 100_000, 1_000_000])
+    p.add_argument('--legacy-max', type=int, default=1_000_000,
+                   help='largest size to also run the old parsers on')
+
+    p = sub.add_parser('suite', help='end-to-end and per-stage runs against bench_stub.py')
+    p.add_argument('--sizes', type=parse_sizes, default=[1_000, 10_000, 100_000, 1_000_000],
+                   help='history rows per series (up to 10M; dates repeat past ~126k days)')
+    p.add_argument('--stages', type=lambda v: v.split(','), default=SUITE_STAGES,
+                   help=f"comma-separated subset of {','.join(SUITE_STAGES)}")
+    p.add_argument('--repeat', type=int, default=3, help='timed runs per case (best is reported)')
+    p.add_argument('--fixtures', help='directory of recorded payloads (see bench_stub.py record)')
+    p.add_argument('--out', help='also write the results, with environment metadata, to this JSON file')
+
+    p = sub.add_parser('startup', help='cold-start import time of the entry points (python -X importtime)')
+    p.add_argument('--targets', type=lambda v: v.split(','), default=STARTUP_TARGETS)
+    p.add_argument('--runs', type=int, default=5)
+    p.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 400)),
+                   help='max import time per target; also fails if pandas/numpy/pyarrow/requests load eagerly')
+
+    p = sub.add_parser('scaling', help='sharded merge+compute throughput by worker process count')
+    p.add_argument('--contracts', type=int, default=200, help='per-contract series in the synthetic universe')
+    p.add_argument('--rows', type=int, default=5_000, help='history rows per contract')
+    p.add_argument('--workers', type=parse_sizes,
+                   default=sorted({1, 2, 4, os.cpu_count() or 1}), help='worker counts (default 1,2,4 and the CPU count)')
+    p.add_argument('--repeat', type=int, default=3, help='timed runs per worker count (best is reported)')
+
+    p = sub.add_parser('compare', help='diff two suite result files')
+    p.add_argument('base')
+    p.add_argument('new')
+    p.add_argument('--threshold', type=float, default=0.2, help='slowdown ratio that counts as a regression')
+
+    args = parser.parse_args()
+    if args.command == 'serialize':
+        results = bench_serialize(args.sizes, args.legacy_max)
+    elif args.command == 'parse':
+        results = bench_parse(args.sizes, args.legacy_max)
+    elif args.command == 'suite':
+        unknown = set(args.stages) - set(SUITE_STAGES)
+        if unknown:
+            parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+        report = bench_suite(args.sizes, args.stages, args.repeat, args.fixtures)
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(report, f, indent=2)
+        results = report if args.json else report['results']
+    elif args.command == 'startup':
+        results = bench_startup(args.targets, args.runs, args.budget_ms)
+        regressions = [r for r in results if not r['ok']]
+        if regressions:
+            print(f"{len(regressions)} entry point(s) over the {args.budget_ms:.0f}ms startup budget "
+                  f"or loading heavy dependencies eagerly", file=sys.stderr)
+    elif args.command == 'scaling':
+        results = bench_scaling(args.contracts, args.rows, args.workers, args.repeat)
+    elif args.command == 'compare':
+        results, regressions = compare(load_results(args.base), load_results(args.new), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the {args.threshold:.0%} threshold", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+    if args.command in ('compare', 'startup') and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
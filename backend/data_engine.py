@@ -1,17 +1,36 @@
 
 import os
+import sys
 import time
 import json
+import math
 import logging
-import requests
-import pandas as pd
 from datetime import datetime, timedelta
-from supabase import create_client, Client
-import urllib3
+import ssl
 import subprocess
+import hashlib
+import threading
+from functools import lru_cache
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlencode, urlsplit
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 
-# Disable SSL warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from lazy_imports import lazy_import
+from series_cache import SeriesCache
+from registry import Registry
+from parsers import SinaKlineParser, parse_jiaoyifamen, to_frame
+from metrics import REGISTRY, RunTrace, profiled
+from resilience import CircuitBreakers, CircuitOpenError, call_with_retries
+from analytics import RollingStats, rolling_stats, stat_columns
+from sharding import ShardPool, assign_shards, read_shared, release, write_shared
+from snapshots import SnapshotStore
+
+# Heavy dependencies load on first use, keeping `import data_engine` (and app/cron cold starts) cheap
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+requests = lazy_import('requests')
+urllib3 = lazy_import('urllib3')
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,11 +41,367 @@ from dotenv import load_dotenv
 # Load env from parent directory (where .env.local usually is for Next.js)
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env.local'))
 
+
+def _env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('0', 'false', 'no', 'off', '')
+
+
+class HttpResponse:
+    """Minimal response shared by the requests and curl transports"""
+    def __init__(self, status, content, headers=None):
+        self.status = status
+        self.content = content or b''
+        self.headers = headers or {}
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content) if self.content else None
+
+
+@lru_cache(maxsize=None)
+def _tls_adapter_class():
+    """HTTPAdapter with a custom SSL context (legacy renegotiation for old upstreams).
+
+    Built on first use so requests is only imported by code that makes requests.
+    """
+    from requests.adapters import HTTPAdapter
+
+    class _TLSAdapter(HTTPAdapter):
+        def __init__(self, ssl_context=None, **kwargs):
+            self._ssl_context = ssl_context
+            super().__init__(**kwargs)
+
+        def init_poolmanager(self, *args, **kwargs):
+            kwargs['ssl_context'] = self._ssl_context
+            return super().init_poolmanager(*args, **kwargs)
+
+        def proxy_manager_for(self, *args, **kwargs):
+            kwargs['ssl_context'] = self._ssl_context
+            return super().proxy_manager_for(*args, **kwargs)
+
+    return _TLSAdapter
+
+
+class HttpClient:
+    """Shared HTTP transport: pooled keep-alive session with retry/backoff.
+
+    Modes (DATAVIEW_HTTP_MODE):
+      requests - in-process pooled session (default)
+      auto     - requests, falling back to curl on TLS/connection errors
+      curl     - curl subprocess for every call (legacy behaviour)
+
+    TLS verification is off unless DATAVIEW_TLS_VERIFY is set to a truthy
+    value or to a CA bundle path, matching the old `curl -k` / `verify=False`.
+    """
+    def __init__(self, mode=None, verify=None, retries=None, backoff=None, pool_size=None, timeout=30, metrics=None):
+        self.mode = (mode or os.environ.get("DATAVIEW_HTTP_MODE", "requests")).lower()
+        if verify is None:
+            raw = os.environ.get("DATAVIEW_TLS_VERIFY", "0")
+            verify = raw if os.path.exists(raw) else _env_flag("DATAVIEW_TLS_VERIFY", False)
+        self.verify = verify
+        self.retries = int(retries if retries is not None else os.environ.get("DATAVIEW_HTTP_RETRIES", 2))
+        self.backoff = float(backoff if backoff is not None else os.environ.get("DATAVIEW_HTTP_BACKOFF", 0.5))
+        self.pool_size = int(pool_size or os.environ.get("DATAVIEW_HTTP_POOL_SIZE", 10))
+        self.timeout = timeout
+        self.metrics = metrics or REGISTRY
+        self.session = self._build_session() if self.mode != 'curl' else None
+
+    def _build_session(self):
+        from urllib3.util.retry import Retry
+        from urllib3.util.ssl_ import create_urllib3_context
+
+        # Disable SSL warnings
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        ctx = create_urllib3_context()
+        # OpenSSL 3 rejects servers without RFC 5746 support ("SSL EOF" on Jiaoyifamen)
+        ctx.options |= getattr(ssl, 'OP_LEGACY_SERVER_CONNECT', 0x4)
+        if not self.verify:
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+        else:
+            ctx.load_default_certs()
+
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=None,  # PostgREST upserts are idempotent, retry them too
+            raise_on_status=False,
+        )
+        adapter = _tls_adapter_class()(ssl_context=ctx, pool_connections=self.pool_size,
+                                       pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.verify = self.verify
+        return session
+
+    def _record(self, method, url, status, elapsed, sent=0, received=0):
+        """Per-host request count, latency and byte counters"""
+        host = urlsplit(url).hostname or ''
+        self.metrics.inc('dataview_http_requests_total', help='HTTP requests by method, host and status',
+                         method=method, host=host, status=status)
+        self.metrics.observe('dataview_http_request_seconds', elapsed, help='HTTP request latency',
+                             method=method, host=host)
+        if sent:
+            self.metrics.inc('dataview_http_sent_bytes_total', sent, help='HTTP request body bytes', host=host)
+        if received:
+            self.metrics.inc('dataview_http_received_bytes_total', received, help='HTTP response body bytes', host=host)
+
+    def request(self, method, url, headers=None, params=None, data=None, timeout=None):
+        start = time.perf_counter()
+        try:
+            response = self._send(method, url, headers, params, data, timeout or self.timeout)
+        except Exception:
+            self._record(method, url, 'error', time.perf_counter() - start)
+            raise
+        self._record(method, url, response.status, time.perf_counter() - start,
+                     len(data) if data else 0, len(response.content))
+        return response
+
+    def _send(self, method, url, headers, params, data, timeout):
+        if self.mode == 'curl':
+            return self._curl(method, url, headers, params, data, timeout)
+        try:
+            resp = self.session.request(method, url, headers=headers, params=params,
+                                        data=data, timeout=timeout)
+            return HttpResponse(resp.status_code, resp.content, resp.headers)
+        except (requests.exceptions.SSLError, requests.exceptions.ConnectionError) as e:
+            if self.mode != 'auto':
+                raise
+            logger.warning(f"HTTP {method} {url} failed ({e}), falling back to curl")
+            return self._curl(method, url, headers, params, data, timeout)
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        return self.request('GET', url, headers=headers, params=params, timeout=timeout)
+
+    def post(self, url, data=None, headers=None, params=None, timeout=None):
+        return self.request('POST', url, headers=headers, params=params, data=data, timeout=timeout)
+
+    def stream(self, url, headers=None, params=None, timeout=None, chunk_size=64 * 1024):
+        """GET `url` and yield the (decoded) body in chunks; curl mode yields it whole"""
+        timeout = timeout or self.timeout
+        start = time.perf_counter()
+        if self.mode != 'curl':
+            received = 0
+            try:
+                with self.session.get(url, headers=headers, params=params, timeout=timeout, stream=True) as resp:
+                    if not 200 <= resp.status_code < 300:
+                        self._record('GET', url, resp.status_code, time.perf_counter() - start)
+                        raise RuntimeError(f"GET {url} returned HTTP {resp.status_code}")
+                    for chunk in resp.iter_content(chunk_size):
+                        received += len(chunk)
+                        yield chunk
+                    self._record('GET', url, resp.status_code, time.perf_counter() - start, received=received)
+                return
+            except (requests.exceptions.SSLError, requests.exceptions.ConnectionError) as e:
+                self._record('GET', url, 'error', time.perf_counter() - start, received=received)
+                if self.mode != 'auto':
+                    raise
+                logger.warning(f"HTTP GET {url} failed ({e}), falling back to curl")
+
+        start = time.perf_counter()
+        response = self._curl('GET', url, headers, params, None, timeout)
+        self._record('GET', url, response.status, time.perf_counter() - start, received=len(response.content))
+        if not response.ok:
+            raise RuntimeError(f"GET {url} returned HTTP {response.status}")
+        yield response.content
+
+    def _curl(self, method, url, headers, params, data, timeout):
+        """Explicit curl fallback; the body goes through stdin, never a temp file"""
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params, safe=',.:()*')}"
+        cmd = ['curl', '-s', '-X', method, '--max-time', str(max(1, math.ceil(timeout))),
+               '-w', '\n%{http_code}', url]
+        if not self.verify:
+            cmd.insert(1, '-k')
+        for k, v in (headers or {}).items():
+            cmd.extend(['-H', f'{k}: {v}'])
+        if data is not None:
+            cmd.extend(['--data-binary', '@-'])
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+
+        logger.info(f"Executing curl: {method} {url}")
+        result = subprocess.run(cmd, input=data, capture_output=True, check=True)
+        content, _, status = result.stdout.rpartition(b'\n')
+        return HttpResponse(int(status or 0), content)
+
+
+_shared_http = None
+_shared_http_lock = threading.Lock()
+
+
+def get_http_client():
+    """Process-wide HttpClient so every DataEngine reuses the same connection pool"""
+    global _shared_http
+    with _shared_http_lock:
+        if _shared_http is None:
+            _shared_http = HttpClient()
+        return _shared_http
+
+
+CRUSH_MARGIN_COLUMNS = [
+    'date', 'soybean_oil_price', 'soybean_meal_price', 'soybean_no2_price',
+    'oil_basis', 'meal_basis', 'gross_margin', 'futures_margin', 'oil_meal_ratio',
+]
+
+
+def serialize_records(df, columns, updated_at=None, date_columns=('date',)):
+    """Encode a DataFrame into one JSON object (bytes) per row in a single vectorized pass.
+
+    Dates are formatted as YYYY-MM-DD, NaN/None become null and every row shares
+    one `updated_at` timestamp (pass updated_at=False for tables without one).
+    The output feeds `DataEngine.upsert_records`.
+    """
+    if df.empty:
+        return []
+    out = df[columns].copy()
+    for col in date_columns:
+        if col in out and pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = out[col].dt.strftime('%Y-%m-%d')
+    if updated_at is not False:
+        out['updated_at'] = updated_at or datetime.now().isoformat()
+    payload = out.to_json(orient='records', lines=True, double_precision=15)
+    return [line for line in payload.encode('utf-8').split(b'\n') if line]
+
+
+def partition_digests(df, freq='M'):
+    """Content hashes of `df` per calendar period (`freq`) of its date column, plus '*' for the whole frame.
+
+    Row hashes come from one vectorized pass; each digest covers the column
+    names and the period's rows in date order. Periods are labelled like
+    str(pd.Period), e.g. '2024-01' for months.
+    """
+    if df.empty:
+        return {}
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', kind='stable')
+    header = ','.join(map(str, df.columns)).encode('utf-8')
+    rows = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    periods = df['date'].dt.to_period(freq)
+    bounds = np.flatnonzero(np.diff(periods.array.asi8)) + 1
+    starts, ends = np.concatenate([[0], bounds]), np.concatenate([bounds, [len(rows)]])
+    labels = periods.iloc[starts].astype(str).tolist()
+    digests, whole = {}, hashlib.sha1(header)
+    for label, start, end in zip(labels, starts.tolist(), ends.tolist()):
+        chunk = rows[start:end].tobytes()
+        digests[label] = hashlib.sha1(header + chunk).hexdigest()[:16]
+        whole.update(chunk)
+    digests['*'] = whole.hexdigest()[:16]
+    return digests
+
+
+def merge_frames(frames, after=None):
+    """Align series frames on date in one pass; columns are named <key>_<column>.
+
+    A frame holding only a date column adds its dates to the index without
+    adding columns (sharded workers use this to see the full calendar).
+    """
+    parts = []
+    for key, df in frames.items():
+        if df is None or df.empty:
+            continue
+        if after is not None:
+            df = df[df['date'] > after]
+        parts.append(df.drop_duplicates('date', keep='last').set_index('date').add_prefix(f"{key}_"))
+    if not parts:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='date'))
+    wide = pd.concat(parts, axis=1, join='outer').sort_index()
+    wide.index.name = 'date'
+    return wide
+
+
+def fill_stale(wide, frames, stale, max_days):
+    """Carry each stale series' last values forward up to `max_days` past its last date.
+
+    Returns {key: boolean Series over wide.index} marking the filled rows.
+    """
+    marks = {}
+    for key in stale:
+        df = frames[key]
+        last = df['date'].max()
+        mask = pd.Series((wide.index > last) & (wide.index <= last + pd.Timedelta(days=max_days)),
+                         index=wide.index)
+        for col in df.columns.drop('date'):
+            column = f"{key}_{col}"
+            if column in wide.columns:
+                wide.loc[mask.to_numpy(), column] = df[col].iloc[-1]
+        marks[key] = mask
+    return marks
+
+
+def evaluate_output(output, wide, params, after=None, stale_column=None, stale=None):
+    """Evaluate a series/spread output on the rows (after `after`) where all its inputs exist.
+
+    `params` are its resolved @NAME values. With a `stale_column`, rows that
+    used a carried-forward value of a stale input (`stale` maps series key ->
+    boolean Series over wide.index) are flagged in it.
+    """
+    columns = ['date'] + list(output['key']) + list(output['columns']) + ([stale_column] if stale_column else [])
+    if any(field not in wide.columns for field in output['fields']):
+        return pd.DataFrame(columns=columns)
+
+    rows = wide if after is None else wide[wide.index > after]
+    rows = rows.loc[rows[output['fields']].notna().all(axis=1)]
+
+    result = pd.DataFrame({'date': rows.index})
+    for col, value in output['key'].items():
+        result[col] = value
+    for col, expr in output['columns'].items():
+        result[col] = rows.eval(expr, local_dict=params).to_numpy() if len(rows) else []
+    if stale_column:
+        flags = np.zeros(len(rows), dtype=bool)
+        for key, mask in (stale or {}).items():
+            if key in output['inputs']:
+                flags |= mask.reindex(rows.index, fill_value=False).to_numpy()
+        result[stale_column] = flags
+    return result[columns]
+
+
+def compute_shard(task):
+    """Process-pool entry point for sharded sync: merge one shard's inputs and evaluate its outputs.
+
+    `task` holds shared memory refs of the input series (sharding.write_shared),
+    the stale keys among them, and per output (output, after, params,
+    stale_column). Returns {output name: ref} of the computed frames.
+    """
+    frames = {key: read_shared(ref) for key, ref in task['inputs'].items()}
+    wide = merge_frames(frames, after=task['floor'])
+    marks = fill_stale(wide, frames, task['stale'], task['stale_max_days'])
+    results = {}
+    try:
+        for output, after, params, stale_column in task['outputs']:
+            df = evaluate_output(output, wide, params, after, stale_column, marks)
+            results[output['name']] = write_shared(df)
+    except BaseException:
+        release(results.values())
+        raise
+    return results
+
+
+def in_periods(df, labels, freq='M'):
+    """Rows of `df` whose date falls in one of the period `labels`"""
+    ordinals = [pd.Period(label, freq).ordinal for label in labels]
+    return df[np.isin(df['date'].dt.to_period(freq).array.asi8, ordinals)]
+
+
 class DataEngine:
-    def __init__(self):
-        url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
+    def __init__(self, fetch_timeout=None, max_workers=None, http_client=None,
+                 supabase_url=None, supabase_key=None, cache=None, registry=None, metrics=None, shards=None):
+        url = supabase_url or os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
         key = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")  # Usually acceptable for public/anon access
-        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or key
+        service_key = supabase_key or os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or key
         
         if not url or not service_key:
             raise ValueError("Missing Supabase credentials in environment variables")
@@ -34,79 +409,195 @@ class DataEngine:
         if not url or not service_key:
             raise ValueError("Missing Supabase credentials in environment variables")
             
-        # self.supabase: Client = create_client(url, service_key)
-        self.supabase = None # DISABLE SUPABASE CLIENT (Using CURL)
+        self.supabase_url = url.rstrip('/')
+        self.supabase_key = service_key
+        self.anon_key = key or service_key
         
         # Constants
         self.OIL_OUTPUT_RATE = 0.185
         self.MEAL_OUTPUT_RATE = 0.785
         self.CRUSH_COST = 150.0
 
-    def _fetch_with_curl(self, url, headers=None):
-        """Fallback to curl if requests fails (often fixes SSL EOF issues)"""
+        # Fetch stage: per-source timeout (seconds) and concurrency limit
+        self.fetch_timeout = float(fetch_timeout or os.environ.get("SYNC_FETCH_TIMEOUT", 30))
+        self.max_workers = int(max_workers or os.environ.get("SYNC_FETCH_CONCURRENCY", 8))
+
+        # Shared transport, created on first request (see the `http` property)
+        self._http = http_client
+
+        # Upstream hosts; point these at bench_stub.py to run without the network
+        self.sina_base_url = os.environ.get("SINA_BASE_URL", "https://stock2.finance.sina.com.cn").rstrip('/')
+        self.jiaoyifamen_base_url = os.environ.get("JIAOYIFAMEN_BASE_URL", "https://www.jiaoyifamen.com").rstrip('/')
+
+        # Counters/histograms for /metrics; per-run spans go to a RunTrace in sync_data
+        self.metrics = metrics or REGISTRY
+
+        # Local series cache (DATAVIEW_CACHE=0 disables it)
+        if cache is None and _env_flag("DATAVIEW_CACHE", True):
+            cache = SeriesCache()
+        self.cache = cache or None
+
+        # Fetch resilience: retries with jittered backoff inside one shared deadline,
+        # per-source circuit breakers, and last-known-good cached series for spreads
+        self.fetch_attempts = int(os.environ.get("SYNC_FETCH_ATTEMPTS", 3))
+        self.fetch_backoff = float(os.environ.get("SYNC_FETCH_BACKOFF", 1.0))
+        self.fetch_deadline = float(os.environ.get("SYNC_FETCH_DEADLINE", 90))
+        self.stale_max_days = int(os.environ.get("SYNC_STALE_MAX_DAYS", 5))
+        self.breakers = CircuitBreakers(
+            self.cache,
+            threshold=int(os.environ.get("SYNC_BREAKER_THRESHOLD", 3)),
+            cooldown=float(os.environ.get("SYNC_BREAKER_COOLDOWN", 1800)),
+        )
+
+        # Registered series/spreads, and the fetcher behind each registry `source`
+        self.registry = registry or Registry.load()
+        self.fetchers = {
+            'sina': self.fetch_sina_futures,
+            'jiaoyifamen': self.fetch_jiaoyifamen,
+        }
+
+        # Callables subscriber(name, df) notified with fresh series/spread rows after each sync
+        self.subscribers = []
+
+        # Change detection: content digests per source series and per output, by date
+        # partition, stored in Supabase next to the data (see supabase/schema.sql)
+        self.digest_table = os.environ.get("SYNC_DIGEST_TABLE", "sync_digests")
+        self.digest_partition = os.environ.get("SYNC_DIGEST_PARTITION", "month")
+        if self.digest_partition not in self.BACKFILL_PARTITIONS:
+            raise ValueError(f"SYNC_DIGEST_PARTITION must be one of {', '.join(self.BACKFILL_PARTITIONS)}")
+
+        # Warm state for a resident process (schedule_runner daemon): the latest
+        # fetched copy of each series, and a lock so runs never overlap
+        self.resident = {}
+        self._run_lock = threading.Lock()
+
+        # Analytics checkpoints computed this run, saved with the watermarks once the rows are stored,
+        # and the last saved ones ({output: (checkpoint file stamp, {metric: RollingStats})}) for the next run
+        self._analytics_checkpoints = {}
+        self._analytics_state = {}
+
+        # Sharded compute: merge and evaluate series/spread outputs in SYNC_SHARDS worker
+        # processes (0 or 1 keeps everything in this process); see _compute_sharded
+        self.shards = int(shards if shards is not None else os.environ.get("SYNC_SHARDS", 0))
+        self._shard_pool = None
+
+        # Versioned Parquet/Arrow snapshots of these outputs after each sync, for bulk readers
+        # (DATAVIEW_SNAPSHOTS=0 disables them; on by default when the local cache is on)
+        self.snapshots = None
+        self.snapshot_outputs = []
+        if _env_flag("DATAVIEW_SNAPSHOTS", self.cache is not None):
+            self.snapshots = SnapshotStore(os.environ.get("DATAVIEW_SNAPSHOT_DIR")
+                                           or (os.path.join(self.cache.root, 'snapshots') if self.cache else None))
+            for name in os.environ.get("SYNC_SNAPSHOT_OUTPUTS", "crush_margins").split(','):
+                if not name:
+                    continue
+                if (self.registry.output(name) or {}).get('kind') == 'spread':
+                    self.snapshot_outputs.append(name)
+                else:
+                    logger.warning(f"SYNC_SNAPSHOT_OUTPUTS: {name} is not a spread output of the registry; not snapshotting it")
+
+    @property
+    def http(self):
+        if self._http is None:
+            self._http = get_http_client()
+        return self._http
+
+    @property
+    def shard_pool(self):
+        if self._shard_pool is None:
+            self._shard_pool = ShardPool(self.shards)
+        return self._shard_pool
+
+    def close(self):
+        """Stop the shard worker processes, if any were started"""
+        if self._shard_pool is not None:
+            self._shard_pool.shutdown()
+            self._shard_pool = None
+
+    def _fetch_text(self, url, headers=None, params=None):
+        """GET through the shared transport; returns body text or None on failure"""
         try:
-            cmd = ['curl', '-k', '-s', url] # -k for insecure, -s for silent
-            if headers:
-                for k, v in headers.items():
-                    cmd.extend(['-H', f'{k}: {v}'])
-            
-            logger.info(f"Executing curl: {' '.join(cmd)}")
-            result = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-            return result.decode('utf-8')
+            response = self.http.get(url, headers=headers, params=params, timeout=self.fetch_timeout)
+            if not response.ok:
+                logger.error(f"GET {url} returned HTTP {response.status}")
+                return None
+            return response.text
         except subprocess.CalledProcessError as e:
-            logger.error(f"Curl failed: {e.output.decode('utf-8')}")
+            logger.error(f"Curl failed: {e.stderr.decode('utf-8', errors='replace')}")
             return None
         except Exception as e:
-            logger.error(f"Curl execution error: {e}")
+            logger.error(f"HTTP GET {url} failed: {e}")
             return None
 
-    def fetch_sina_futures(self, symbol="B0"):
+    def _cached_fetch(self, source, symbol, fetch, use_cache=True, refresh=False):
+        """Serve a series from the local cache while fresh, otherwise fetch and merge.
+
+        Neither upstream accepts a start date, so a refresh still downloads the
+        upstream window; the cache skips that download entirely within its TTL
+        and keeps history that has scrolled out of the window. `refresh=True`
+        always downloads (e.g. at a scheduled market close) but still merges.
+        """
+        if not (use_cache and self.cache):
+            return fetch()
+
+        if not refresh and self.cache.is_fresh(source, symbol):
+            cached = self.cache.read(source, symbol)
+            if cached is not None and not cached.empty:
+                logger.info(f"Using cached {source}/{symbol} ({len(cached)} rows)")
+                self.metrics.inc('dataview_cache_requests_total', help='Series cache lookups by result',
+                                 source=source, result='hit')
+                return cached
+
+        self.metrics.inc('dataview_cache_requests_total', help='Series cache lookups by result',
+                         source=source, result='miss')
+        df = fetch()
+        if df.empty:
+            return df
+        try:
+            return self.cache.merge(source, symbol, df)
+        except Exception as e:
+            logger.warning(f"Could not update cache for {source}/{symbol}: {e}")
+            return df
+
+    def fetch_sina_futures(self, symbol="B0", use_cache=True, refresh=False):
         """Fetch Soybean No.2 (B0) data using exact logic from v3 script (Akshare based)"""
         timestamp = int(time.time() * 1000)
         url = f"https://stock2.finance.sina.com.cn/futures/api/jsonp.php/var%20_{symbol}_{timestamp}=/GlobalFuturesService.getGlobalFuturesDailyKLine?symbol={symbol}&_={timestamp}&source=web&page=1&num=1000"
         
-        return self._fetch_sina_manual_implementation(symbol)
+        return self._cached_fetch('sina', symbol, lambda: self._fetch_sina_manual_implementation(symbol),
+                                  use_cache, refresh)
 
-    def _fetch_sina_manual_implementation(self, symbol):
-        url = f"https://stock2.finance.sina.com.cn/futures/api/jsonp.php/var%20_{symbol}=/InnerFuturesNewService.getDailyKLine?symbol={symbol}&_={int(time.time()*1000)}"
+    def sina_request(self, symbol):
+        """(url, headers) of the Sina daily K-line request for `symbol`"""
+        url = f"{self.sina_base_url}/futures/api/jsonp.php/var%20_{symbol}=/InnerFuturesNewService.getDailyKLine?symbol={symbol}&_={int(time.time()*1000)}"
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://finance.sina.com.cn/',
         }
+        return url, headers
+
+    def _fetch_sina_manual_implementation(self, symbol):
+        url, headers = self.sina_request(symbol)
         try:
             logger.info(f"Fetching Sina data for {symbol}...")
-            # Try plain requests first, but fail over to curl if needed
-            try:
-                response = requests.get(url, headers=headers, timeout=10, verify=False)
-                text = response.text
-            except Exception as e:
-                logger.warning(f"Requests failed for Sina, using curl: {e}")
-                text = self._fetch_with_curl(url, headers)
-
-            if not text:
-                return pd.DataFrame()
-
-             # Robust parsing: Find the first '[' and last ']'
-            first_bracket = text.find('[')
-            last_bracket = text.rfind(']')
-            
-            if first_bracket != -1 and last_bracket != -1 and last_bracket > first_bracket:
-                json_str = text[first_bracket:last_bracket+1]
-                data = json.loads(json_str)
-                df = pd.DataFrame(data)
-                df = df.rename(columns={'d': 'date', 'c': 'close'})
-                df['date'] = pd.to_datetime(df['date'])
-                df['close'] = pd.to_numeric(df['close'])
-                df = df[['date', 'close']].sort_values('date')
-                return df
-            return pd.DataFrame()
+            # Decode straight from the response stream into column arrays
+            parser = SinaKlineParser()
+            for chunk in self.http.stream(url, headers=headers, timeout=self.fetch_timeout):
+                parser.feed(chunk)
+            dates, closes = parser.finish()
+            return to_frame(dates, close=closes)
         except Exception as e:
             logger.error(f"Sina Fetch Error: {e}")
             return pd.DataFrame()
 
-    def fetch_jiaoyifamen(self, kind):
-        """Fetch data from Jiaoyifamen using settings from v3 script"""
-        url = "https://www.jiaoyifamen.com/tools/api/future-basis/query"
+    def fetch_jiaoyifamen(self, kind, use_cache=True, refresh=False):
+        """Fetch price/basis history for `kind` from Jiaoyifamen, via the local cache"""
+        return self._cached_fetch('jiaoyifamen', kind, lambda: self._fetch_jiaoyifamen_upstream(kind),
+                                  use_cache, refresh)
+
+    def jiaoyifamen_request(self, kind):
+        """(url, headers, params) of the Jiaoyifamen future-basis request for `kind`"""
+        url = f"{self.jiaoyifamen_base_url}/tools/api/future-basis/query"
         params = {
             "type": kind,
             "t": int(time.time() * 1000)
@@ -118,279 +609,1083 @@ class DataEngine:
             'Accept': 'application/json, text/javascript, */*; q=0.01',
             'X-Requested-With': 'XMLHttpRequest'
         }
-        
+        return url, headers, params
+
+    def _fetch_jiaoyifamen_upstream(self, kind):
+        """Fetch data from Jiaoyifamen using settings from v3 script"""
+        url, headers, params = self.jiaoyifamen_request(kind)
         try:
             logger.info(f"Fetching Jiaoyifamen data for {kind}...")
             
-            # Construct full URL with params for curl
-            full_url = f"{url}?type={params['type']}&t={params['t']}"
-            
-            # USE CURL DIRECTLY to avoid SSL EOF errors on Python 3.13
-            text = self._fetch_with_curl(full_url, headers)
-            
-            if text:
-                try:
-                    data = json.loads(text)
-                except json.JSONDecodeError as e:
-                    logger.error(f"JSON decode fail: {e}")
-                    return pd.DataFrame()
-            else:
-                 logger.error("Curl failed or returned empty")
+            # The shared transport enables legacy TLS renegotiation, which is what
+            # used to break plain requests here with SSL EOF errors on Python 3.13
+            text = self._fetch_text(url, headers, params=params)
+            if not text:
+                 logger.error("Request failed or returned empty")
                  return pd.DataFrame()
-            
-            # Logic from v3: 解析元爬虫数据
-            raw_data = data.get('data', {})
-            if not raw_data:
-                return pd.DataFrame()
 
-            keys = list(raw_data.keys())
-            cat_key = next((k for k in keys if 'category' in k.lower()), None)
-            price_key = next((k for k in keys if 'price' in k.lower()), None)
-            basis_key = next((k for k in keys if 'basis' in k.lower()), None)
-            
-            if not (cat_key and price_key and basis_key):
+            # Logic from v3 (解析元爬虫数据), vectorized: category/price/basis arrays
+            # go straight to typed columns, MM-DD labels get their year inferred
+            try:
+                parsed = parse_jiaoyifamen(text)
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON decode fail: {e}")
+                return pd.DataFrame()
+            if parsed is None:
                 return pd.DataFrame()
-            
-            dates = raw_data[cat_key]
-            prices = raw_data[price_key]
-            bases = raw_data[basis_key]
-            
-            min_len = min(len(dates), len(prices), len(bases))
-            result = []
-            
-            current_date = datetime.now()
-            current_year = current_date.year
-            current_month = current_date.month
-            
-            for i in range(min_len):
-                d_str = dates[i]
-                if '-' in d_str and len(d_str) <= 5:
-                    m, d = map(int, d_str.split('-'))
-                    year = current_year
-                    if current_month < m:
-                        year = current_year - 1
-                    
-                    d_str = f"{year}-{m:02d}-{d:02d}"
-                    
-                result.append({
-                    'date': d_str,
-                    'price': float(prices[i]),
-                    'basis': float(bases[i])
-                })
 
-            df = pd.DataFrame(result)
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            df = df.dropna().sort_values('date')
-            return df
+            dates, price, basis = parsed
+            return to_frame(dates, price=price, basis=basis)
 
         except Exception as e:
             logger.error(f"Error fetching Jiaoyifamen {kind}: {e}")
             return pd.DataFrame()
 
-    def _supabase_rest_request(self, method, endpoint, params=None, body=None):
-        """Execute Supabase REST API request using curl"""
-        # Endpoint example: /rest/v1/crush_margins
-        url = f"{os.environ.get('NEXT_PUBLIC_SUPABASE_URL')}{endpoint}"
-        
+    def _supabase_headers(self, extra=None):
         headers = {
-            "apikey": os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY"),
-            "Authorization": f"Bearer {os.environ.get('SUPABASE_SERVICE_ROLE_KEY') or os.environ.get('NEXT_PUBLIC_SUPABASE_ANON_KEY')}",
+            "apikey": self.anon_key,
+            "Authorization": f"Bearer {self.supabase_key}",
             "Content-Type": "application/json",
             "Prefer": "return=minimal" # or return=representation
         }
-        
-        if params:
-            # Simple query param construction
-            query_string = "&".join([f"{k}={v}" for k, v in params.items()])
-            url = f"{url}?{query_string}"
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def _supabase_rest_request(self, method, endpoint, params=None, body=None, headers=None):
+        """Execute Supabase REST API request through the shared HTTP transport"""
+        # Endpoint example: /rest/v1/crush_margins
+        url = f"{self.supabase_url}{endpoint}"
+        request_headers = self._supabase_headers(headers)
 
-        import subprocess
         try:
-            cmd = ['curl', '-k', '-s', '-X', method, url]
-            for k, v in headers.items():
-                cmd.extend(['-H', f'{k}: {v}'])
-            
-            if body:
-                json_body = json.dumps(body)
-                # For Windows cmd/powershell, escaping quotes in JSON might be tricky.
-                # Writing to a temp file is safer.
-                with open('temp_body.json', 'w') as f:
-                    f.write(json_body)
-                cmd.extend(['-d', '@temp_body.json'])
-            
-            logger.info(f"Executing Supabase curl: {method} {url}")
-            result = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-            
-            if body and os.path.exists('temp_body.json'):
-                os.remove('temp_body.json')
-                
-            response_text = result.decode('utf-8')
-            if not response_text:
+            data = None
+            if body is not None:
+                data = body if isinstance(body, (bytes, str)) else json.dumps(body)
+
+            logger.info(f"Supabase REST: {method} {url}")
+            response = self.http.request(method, url, headers=request_headers, params=params, data=data)
+            if not response.ok:
+                logger.error(f"Supabase REST {method} {endpoint} returned HTTP {response.status}: {response.text[:500]}")
+                return None
+
+            if not response.content:
                 return []
             try:
-                return json.loads(response_text)
-            except:
-                return response_text
+                return response.json()
+            except ValueError:
+                return response.text
                 
         except Exception as e:
-            logger.error(f"Supabase Curl Error: {e}")
-            if body and os.path.exists('temp_body.json'):
-                os.remove('temp_body.json')
+            logger.error(f"Supabase REST Error: {e}")
             return None
 
-    def sync_data(self):
-        """Main execution flow: Fetch, Merge, Calculate, Upsert"""
-        print("DEBUG: Starting sync_data", flush=True)
-        
-        # 1. Fetch all data
+    def _upsert_batch(self, table, rows, on_conflict):
+        """POST one batch of pre-encoded rows.
+
+        Returns True when stored, False when the server answered 413 Payload
+        Too Large to a batch of more than one row (the caller re-packs it).
+        """
+        body = b'[' + b','.join(rows) + b']'
+        with self.metrics.timer('dataview_upload_batch_seconds', help='Upsert request latency', table=table):
+            response = self.http.post(
+                f"{self.supabase_url}/rest/v1/{table}",
+                data=body,
+                params={"on_conflict": on_conflict},
+                headers=self._supabase_headers({"Prefer": "resolution=merge-duplicates,return=minimal"}),
+            )
+        self.metrics.inc('dataview_upload_batches_total', help='Upsert requests by table and HTTP status',
+                         table=table, status=response.status)
+        if response.status == 413 and len(rows) > 1:
+            return False
+        if not response.ok:
+            raise RuntimeError(f"Upsert into {table} failed with HTTP {response.status}: {response.text[:500]}")
+        self.metrics.inc('dataview_upload_rows_total', len(rows), help='Rows upserted', table=table)
+        self.metrics.inc('dataview_upload_bytes_total', len(body), help='Upsert body bytes accepted', table=table)
+        return True
+
+    def upsert_records(self, table, records, on_conflict='date', max_batch_bytes=None):
+        """Bulk upsert `records` into `table` via PostgREST.
+
+        Records (dicts, or already-encoded JSON objects as str/bytes) are packed
+        into in-memory request bodies of at most `max_batch_bytes` each
+        (SUPABASE_UPSERT_BATCH_BYTES, default 4 MiB) and written with
+        `on_conflict` + `Prefer: resolution=merge-duplicates`, so re-running a
+        sync updates rows instead of failing on the primary key. When the
+        server answers 413, the budget drops once, to half the rejected body
+        but never below the largest body already accepted, and the rejected
+        rows go back through the packer; the smaller budget holds for the
+        rest of the call. Returns {"rows", "batches", "bytes"}; raises
+        RuntimeError on failure.
+        """
+        budget = int(max_batch_bytes or os.environ.get("SUPABASE_UPSERT_BATCH_BYTES", 4 * 1024 * 1024))
+        stats = {"rows": 0, "batches": 0, "bytes": 0}
+        accepted = 0  # largest body the server has taken
+        retry = deque()
+        batch, batch_bytes = [], 2  # the surrounding '[' and ']'
+
+        def encoded():
+            for record in records:
+                if isinstance(record, dict):
+                    record = json.dumps(record, separators=(',', ':'), allow_nan=False)
+                if isinstance(record, str):
+                    record = record.encode('utf-8')
+                stats["rows"] += 1
+                yield record
+
+        def flush():
+            nonlocal batch, batch_bytes, budget, accepted
+            rows, size = batch, batch_bytes
+            batch, batch_bytes = [], 2
+            if self._upsert_batch(table, rows, on_conflict):
+                stats["batches"] += 1
+                stats["bytes"] += size
+                accepted = max(accepted, size)
+                return
+            budget = max(size // 2, accepted if accepted < size else 0)
+            logger.warning(f"Upsert batch of {size} bytes rejected as too large, shrinking to {budget}")
+            retry.extendleft(reversed(rows))
+
+        source = encoded()
+        while True:
+            record = retry.popleft() if retry else next(source, None)
+            if record is None:
+                if not batch:
+                    break
+                flush()
+                continue
+            if batch and batch_bytes + len(record) + 1 > budget:
+                retry.appendleft(record)
+                flush()
+                continue
+            batch.append(record)
+            batch_bytes += len(record) + 1
+
+        logger.info(f"Upserted {stats['rows']} rows into {table} in {stats['batches']} request(s), {stats['bytes']} bytes")
+        return stats
+
+    def fetch_all(self, sources, deadline=None):
+        """Fetch several sources concurrently.
+
+        `sources` maps a name to a zero-argument callable returning a DataFrame.
+        Each source gets `fetch_timeout` seconds from the moment it starts running,
+        or, when `deadline` (a time.monotonic() value) is given, until that shared
+        deadline; at most `max_workers` run at once. Returns (frames, timings)
+        where a failed or timed-out source yields an empty DataFrame.
+        """
+        def expires(name):
+            return deadline if deadline is not None else started[name] + self.fetch_timeout
+
+        frames = {name: pd.DataFrame() for name in sources}
+        timings = {}
+        started = {}
+
+        def run(name, fn):
+            started[name] = time.monotonic()
+            try:
+                return fn()
+            finally:
+                elapsed = time.monotonic() - started[name]
+                timings.setdefault(name, round(elapsed, 3))
+                self.metrics.observe('dataview_fetch_seconds', elapsed, help='Per-source fetch latency', source=name)
+
+        def outcome(name, result, rows=0):
+            self.metrics.inc('dataview_fetch_total', help='Per-source fetches by outcome', source=name, outcome=result)
+            if rows:
+                self.metrics.inc('dataview_fetch_rows_total', rows, help='Rows returned per source', source=name)
+
+        t0 = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix="fetch")
         try:
-            print("DEBUG: Fetching Oil", flush=True)
-            df_oil = self.fetch_jiaoyifamen('Y')
-            print(f"DEBUG: Oil fetched, size={len(df_oil)}", flush=True)
-        except Exception as e:
-            logger.error(f"Failed fetching Oil: {e}")
-            df_oil = pd.DataFrame()
+            pending = {executor.submit(run, name, fn): name for name, fn in sources.items()}
+            while pending:
+                now = time.monotonic()
+                # Wake up when the earliest running source would hit its timeout
+                deadlines = [expires(n) for n in pending.values() if n in started]
+                if deadline is not None:
+                    deadlines.append(deadline)
+                wait_for = max(0.0, min(deadlines) - now) if deadlines else self.fetch_timeout
+                done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        df = future.result()
+                        frames[name] = df if df is not None else pd.DataFrame()
+                        outcome(name, 'success' if len(frames[name]) else 'empty', len(frames[name]))
+                        logger.info(f"Fetched {name}: {len(frames[name])} rows in {timings.get(name)}s")
+                    except Exception as e:
+                        outcome(name, 'circuit_open' if isinstance(e, CircuitOpenError) else 'failure')
+                        logger.error(f"Failed fetching {name}: {e}")
+
+                now = time.monotonic()
+                for future, name in list(pending.items()):
+                    if (name in started and now >= expires(name)) or (deadline is not None and now >= deadline):
+                        future.cancel()
+                        pending.pop(future)
+                        timings[name] = round(now - started[name], 3) if name in started else 0.0
+                        outcome(name, 'timeout')
+                        logger.error(f"Fetching {name} timed out after {timings[name]}s")
+        finally:
+            # Don't block on timed-out workers; they finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        timings['total'] = round(time.monotonic() - t0, 3)
+        return frames, timings
 
+    def fetch_series(self, keys=None, refresh=False):
+        """Fetch registered series (all, or only `keys`) concurrently; returns (frames, timings).
+
+        `refresh=True` bypasses cache freshness and always asks the upstream.
+        """
+        sources = {}
+        for series in self.registry.series:
+            if keys is not None and series['key'] not in keys:
+                continue
+            fetcher = self.fetchers.get(series['source'])
+            if fetcher is None:
+                logger.error(f"Unknown source {series['source']} for series {series['key']}")
+                continue
+            fetch = lambda fetcher=fetcher, symbol=series['symbol']: fetcher(symbol, refresh=refresh)
+            sources[series['key']] = lambda key=series['key'], fetch=fetch: self._fetch_resilient(key, fetch, deadline)
+        deadline = time.monotonic() + self.fetch_deadline
+        return self.fetch_all(sources, deadline=deadline)
+
+    def _fetch_resilient(self, key, fetch, deadline):
+        """Run one series fetch behind its circuit breaker, retrying empty results until `deadline`"""
+        if not self.breakers.allow(key):
+            raise CircuitOpenError(f"circuit open for {key}, not calling upstream")
         try:
-            print("DEBUG: Fetching Meal", flush=True)
-            df_meal = self.fetch_jiaoyifamen('M')
-            print(f"DEBUG: Meal fetched, size={len(df_meal)}", flush=True)
-        except Exception as e:
-            logger.error(f"Failed fetching Meal: {e}")
-            df_meal = pd.DataFrame()
-            
+            df = call_with_retries(fetch, attempts=self.fetch_attempts, deadline=deadline,
+                                   base=self.fetch_backoff, ok=lambda df: df is not None and not df.empty)
+        except Exception:
+            self.breakers.record_failure(key)
+            raise
+        if df is None or df.empty:
+            self.breakers.record_failure(key)
+        else:
+            self.breakers.record_success(key)
+        return df
+
+    def _fallback_to_cache(self, frames):
+        """Swap failed series for their last-known-good cached copy; returns the stale keys"""
+        stale = []
+        if not self.cache:
+            return stale
+        for series in self.registry.series:
+            key = series['key']
+            if key not in frames or not frames[key].empty:
+                continue
+            cached = self.cache.read(series['source'], series['symbol'])
+            if cached is not None and not cached.empty:
+                frames[key] = cached.sort_values('date')
+                stale.append(key)
+                logger.warning(f"Using last-known-good {key} from cache (through {cached['date'].max().date()})")
+        return stale
+
+    def _fill_stale(self, wide, frames, stale):
+        """Carry each stale series' last values forward (see fill_stale); returns the filled-row masks"""
+        return fill_stale(wide, frames, stale, self.stale_max_days)
+
+    def build_wide_frame(self, frames, after=None):
+        """Align every fetched series on date in one pass; columns are named <key>_<column>"""
+        return merge_frames(frames, after)
+
+    def _output_params(self, output):
+        """Resolve @NAME references: registry params first, then engine constants (CRUSH_COST etc.)"""
+        return {name: output['params'].get(name, getattr(self, name, None)) for name in output['param_names']}
+
+    def compute_output(self, output, wide, after=None, stale=None):
+        """Evaluate one registry output on the rows (after `after`) where all its inputs exist.
+
+        Tables with a `stale_column` get it set on rows that used a carried-forward
+        value from a stale input (`stale` maps series key -> boolean Series over wide.index).
+        """
+        if output['kind'] == 'analytics':
+            return self._compute_analytics(output, wide, after)
+        stale_column = self.registry.table(output['table']).get('stale_column')
+        return evaluate_output(output, wide, self._output_params(output), after, stale_column, stale)
+
+    @staticmethod
+    def _merge_floor(plans):
+        """Oldest `after` of the plans, or None when any of them needs the whole history"""
+        afters = [after for _, _, after in plans]
+        return min(afters) if afters and all(a is not None for a in afters) else None
+
+    def _merge_inputs(self, frames, keys, stale):
+        """The frames of `keys`; with a stale one among them, every other series' dates as well,
+        so stale values are carried over the same calendar as in a merge of all series"""
+        inputs = {key: frames[key] for key in frames if key in keys}
+        if any(key in keys for key in stale):
+            inputs.update({key: df[['date']] for key, df in frames.items() if key not in keys and not df.empty})
+        return inputs
+
+    def _compute_plans(self, plans, frames, stale, trace):
+        """Compute every planned output; returns [(output, mode, df)] in plan order.
+
+        With more than one shard, series and spread outputs go to the worker
+        processes (_compute_sharded). Analytics outputs, which continue from
+        checkpoints in the local cache, and everything in single-process mode
+        are computed here on one merged frame.
+        """
+        sharded = [p for p in plans if p[0]['kind'] != 'analytics'] if self.shards > 1 else []
+        results = {}
+        if len(sharded) > 1:
+            with trace.span('sharded_compute', shards=min(self.shards, len(sharded))):
+                results = self._compute_sharded(sharded, frames, stale)
+        local = [p for p in plans if p[0]['name'] not in results]
+        if local:
+            keys = {key for output, _, _ in local for key in output['inputs']} if results else set(frames)
+            with trace.span('merge'):
+                wide = self.build_wide_frame(self._merge_inputs(frames, keys, stale), after=self._merge_floor(local))
+                stale_marks = self._fill_stale(wide, frames, [key for key in stale if key in keys])
+            trace.count('merged_rows', len(wide))
+            for output, mode, after in local:
+                with trace.span('compute', output=output['name']):
+                    results[output['name']] = self.compute_output(output, wide, after, stale_marks)
+        return [(output, mode, results[output['name']]) for output, mode, _ in plans]
+
+    def _compute_sharded(self, plans, frames, stale):
+        """Merge and evaluate series/spread outputs in the shard worker processes; returns {name: df}.
+
+        Outputs are grouped into at most `shards` tasks of similar input size,
+        and each task merges only the series its outputs read. Every input
+        series is written to shared memory once, as Arrow IPC, and read in
+        place by the workers that need it; results come back the same way.
+        """
+        by_name = {output['name']: (output, after) for output, _, after in plans}
+        costs = {name: sum(len(frames[key]) for key in output['inputs']) for name, (output, _) in by_name.items()}
+        shared = {}
+
+        def ref(key, df):
+            name = (key, tuple(df.columns))  # a series, or just its dates
+            if name not in shared:
+                shared[name] = write_shared(df)
+            return shared[name]
+
+        try:
+            tasks = []
+            for names in assign_shards(costs, self.shards):
+                members = [by_name[name] for name in names]
+                keys = {key for output, _ in members for key in output['inputs']}
+                tasks.append({
+                    'inputs': {key: ref(key, df) for key, df in self._merge_inputs(frames, keys, stale).items()},
+                    'floor': self._merge_floor([(output, None, after) for output, after in members]),
+                    'stale': [key for key in stale if key in keys],
+                    'stale_max_days': self.stale_max_days,
+                    'outputs': [(output, after, self._output_params(output),
+                                 self.registry.table(output['table']).get('stale_column'))
+                                for output, after in members],
+                })
+            results = self.shard_pool.map(compute_shard, tasks)
+            try:
+                return {name: read_shared(r) for refs in results for name, r in refs.items()}
+            finally:
+                release([r for refs in results for r in refs.values()])
+        finally:
+            release(shared.values())
+
+    def _compute_analytics(self, output, wide, after=None):
+        """Rolling statistics (analytics.py) of an analytics output's metrics, one row per (date, metric).
+
+        Without `after` the whole history in `wide` is computed in one
+        vectorized pass. With it, only rows after `after` are computed,
+        continuing from the checkpoint saved by the last run: each metric's
+        RollingStats as of that run's final partition, which `after` never
+        precedes (see _plan_outputs), so a run costs O(rows appended) rather
+        than a replay of the history. The next checkpoint is kept until the
+        rows are stored.
+        """
+        windows = output['windows']
+        columns = ['date', 'metric'] + stat_columns(windows)
+        if any(field not in wide.columns for field in output['fields']):
+            return pd.DataFrame(columns=columns)
+        rows = wide.loc[wide[output['fields']].notna().all(axis=1)]
+        params = self._output_params(output)
+        metrics = pd.DataFrame({metric: rows.eval(expr, local_dict=params).to_numpy() if len(rows) else []
+                                for metric, expr in output['columns'].items()}, index=rows.index)
+
+        resumed = None
+        if after is not None:
+            metrics = metrics[metrics.index > after]
+            resumed = self._resume_analytics(output, after + pd.Timedelta(days=1))
+            if resumed is None:
+                logger.warning(f"No analytics checkpoint for {output['name']}; statistics restart at {after.date()}")
+        boundary = None
+        if len(metrics):
+            boundary = metrics.index.max().to_period(self.BACKFILL_PARTITIONS[self.digest_partition]).start_time
+        parts, checkpoint = [], {}
+        for metric in output['columns']:
+            values = metrics[metric][np.isfinite(metrics[metric])]
+            early = values[values.index < boundary] if boundary is not None else values
+            late = values.iloc[len(early):]
+            if resumed is not None:
+                stats = resumed[metric]
+                result = stats.extend(early.index, early.to_numpy())
+                checkpoint[metric] = stats.copy()
+                result = pd.concat([result, stats.extend(late.index, late.to_numpy())], ignore_index=True)
+            else:
+                result = rolling_stats(values.index, values.to_numpy(), windows)
+                checkpoint[metric] = RollingStats.from_history(early.index, early.to_numpy(), windows)
+            result.insert(1, 'metric', metric)
+            parts.append(result)
+        result = pd.concat(parts, ignore_index=True).sort_values(['date', 'metric'], kind='stable')
+        if boundary is not None:
+            self._analytics_checkpoints[output['name']] = (checkpoint, boundary)
+        return result[columns].reset_index(drop=True)
+
+    def _resume_analytics(self, output, boundary):
+        """{metric: RollingStats} from the checkpoint taken at `boundary`, or None when there is none.
+
+        The checkpoint this process saved last is reused (as copies) while the
+        cached one is still that file; otherwise the persisted state is loaded.
+        Checkpoints written before states were persisted hold the metric
+        history instead, which is replayed.
+        """
+        if not self.cache:
+            return None
+        meta = self.cache.meta('analytics', output['name'])
+        if meta.get('boundary') != str(boundary.date()):
+            return None
+        warm = self._analytics_state.get(output['name'])
+        if warm is not None and warm[0] == meta.get('fetched_at'):
+            return {metric: stats.copy() for metric, stats in warm[1].items()}
+        checkpoint = self.cache.read('analytics', output['name'])
+        if checkpoint is None:
+            return None
+        if 'stats' in meta:
+            return {metric: RollingStats.from_state(meta['stats'][metric], checkpoint[metric].dropna().to_numpy())
+                    for metric in output['columns']}
+        resumed = {}
+        for metric in output['columns']:
+            past = checkpoint[np.isfinite(checkpoint[metric])]
+            resumed[metric] = RollingStats.from_history(past['date'], past[metric].to_numpy(), output['windows'])
+        return resumed
+
+    def _save_analytics_checkpoint(self, output, states, boundary):
+        """Persist each metric's RollingStats as of `boundary`, and keep them for this process's next run.
+
+        The cached frame holds every metric's values sorted (NaN-padded to a
+        common length); the rest of the state, a few hundred numbers per
+        metric, goes in the cache metadata.
+        """
+        stats, values = {}, {}
+        for metric, rolling in states.items():
+            stats[metric], values[metric] = rolling.state()
+        length = max(len(v) for v in values.values())
+        frame = pd.DataFrame({metric: np.pad(v, (0, length - len(v)), constant_values=np.nan)
+                              for metric, v in values.items()})
+        self.cache.write('analytics', output['name'], frame, boundary=str(boundary.date()), stats=stats)
+        self._analytics_state[output['name']] = (self.cache.meta('analytics', output['name']).get('fetched_at'), states)
+
+    def _output_fingerprint(self, output):
+        fingerprint = {'params': self._output_params(output), 'columns': output['columns']}
+        if 'windows' in output:
+            fingerprint['windows'] = output['windows']
+        return fingerprint
+
+    def _plan_outputs(self, failed, rebuild, stale=(), revised=None):
+        """Decide per output whether to compute incrementally, fully, or rebuild.
+
+        Outputs of a failed series are skipped; so are a stale series' own
+        writes (re-uploading cached prices adds nothing), while spreads may
+        still use the stale series. Incremental outputs restart at the first
+        digest partition that is at or after their watermark or, when an input
+        was revised earlier (`revised` maps series key -> first changed date),
+        at that partition instead.
+        """
+        freq = self.BACKFILL_PARTITIONS[self.digest_partition]
+        revised = revised or {}
+        state = self.cache.read_state('watermarks') if self.cache else {}
+        plans, skipped = [], []
+        for output in self.registry.outputs:
+            unavailable = set(failed) | (set(stale) if output['kind'] == 'series' else set())
+            if any(key in unavailable for key in output['inputs']):
+                skipped.append(output['name'])
+                continue
+            watermark = state.get(output['name']) or {}
+            fingerprint = self._output_fingerprint(output)
+            if rebuild:
+                plans.append((output, 'rebuild', None))
+            elif not watermark.get('date'):
+                plans.append((output, 'full', None))
+            elif {k: watermark.get(k) for k in fingerprint} != fingerprint:
+                logger.warning(f"Definition of {output['name']} changed since the last run; rebuilding its history")
+                plans.append((output, 'rebuild', None))
+            else:
+                after = pd.Timestamp(watermark['date'])
+                rewind = min((revised[key] for key in output['inputs'] if key in revised), default=None)
+                if rewind is not None and rewind <= after:
+                    logger.info(f"Inputs of {output['name']} revised from {rewind.date()}; recomputing from there")
+                    after = rewind
+                # Whole partitions only, so each computed partition's digest is comparable
+                after = after.to_period(freq).start_time - pd.Timedelta(days=1)
+                if output['kind'] == 'analytics':
+                    # Statistics resume from the checkpoint taken at the start of the last run's final partition
+                    boundary = self.cache.meta('analytics', output['name']).get('boundary') if self.cache else None
+                    if boundary is None or pd.Timestamp(boundary) > after + pd.Timedelta(days=1):
+                        plans.append((output, 'full', None))
+                        continue
+                    after = pd.Timestamp(boundary) - pd.Timedelta(days=1)
+                plans.append((output, 'incremental', after))
+        return plans, skipped
+
+    def _save_watermarks(self, computed):
+        """Persist derived rows and move each output's watermark to its last computed date.
+
+        Watermarks are per output, not per input: an output only has rows
+        where all of its inputs exist (stale-filled rows excepted), so its last
+        computed date never passes its slowest input, and that input's late
+        rows are picked up when the next run resumes from the watermark.
+        """
+        if not self.cache or not computed:
+            return
         try:
-            print("DEBUG: Fetching Bean", flush=True)
-            df_bean = self.fetch_sina_futures('B0')
-            print(f"DEBUG: Bean fetched, size={len(df_bean)}", flush=True)
+            state = self.cache.read_state('watermarks')
+            for output, mode, df in computed:
+                if df.empty:
+                    continue
+                if output['kind'] == 'spread':
+                    if mode in ('incremental', 'backfill'):
+                        self.cache.merge('derived', output['name'], df)
+                    else:
+                        self.cache.write('derived', output['name'], df)
+                elif output['kind'] == 'analytics':
+                    for name, part in self._analytics_datasets(output, df):
+                        if mode == 'incremental':
+                            self.cache.merge('derived', name, part)
+                        else:
+                            self.cache.write('derived', name, part)
+                    checkpoint = self._analytics_checkpoints.pop(output['name'], None)
+                    if checkpoint is not None:
+                        self._save_analytics_checkpoint(output, *checkpoint)
+                stale_column = self.registry.table(output['table']).get('stale_column')
+                fresh = df if not stale_column else df[~df[stale_column].astype(bool)]
+                if fresh.empty:
+                    continue
+                # Stale rows stay after the watermark so the next run recomputes them with real data
+                last = str(fresh['date'].max().date())
+                previous = state.get(output['name']) or {}
+                if mode == 'backfill' and previous.get('date', '') > last and \
+                        {k: previous.get(k) for k in ('params', 'columns')} == self._output_fingerprint(output):
+                    continue  # a backfill of an older range must not move the watermark back
+                state[output['name']] = {
+                    'date': last,
+                    **self._output_fingerprint(output),
+                    'updated_at': datetime.now().isoformat(),
+                }
+            self.cache.write_state('watermarks', state)
         except Exception as e:
-            logger.error(f"Failed fetching Bean: {e}")
-            df_bean = pd.DataFrame()
-        
-        if df_oil.empty or df_meal.empty or df_bean.empty:
-            logger.error("One or more data sources failed. Aborting sync.")
-            return {"status": "error", "message": "Failed to fetch source data"}
+            logger.warning(f"Could not persist watermarks: {e}")
 
-        # 2. Merge DataFrames
+    def _analytics_datasets(self, output, df):
+        """Split analytics rows into one dataset per metric, named <output>.<metric>"""
+        return [(f"{output['name']}.{metric}", part.drop(columns='metric'))
+                for metric, part in df.groupby('metric', sort=False)]
+
+    def _write_snapshots(self, computed, changed):
+        """Write a new snapshot version of each snapshot output whose rows changed (or that has none yet).
+
+        A version whose content digest matches the current one is not written
+        again. The snapshot covers the whole history: the derived cache after
+        _save_watermarks, or the computed rows of a full run without a cache.
+        Returns {output name: version written}.
+        """
+        if not self.snapshots:
+            return {}
+        versions = {}
+        for output, mode, df in computed:
+            name = output['name']
+            if name not in self.snapshot_outputs or (name not in changed and self.snapshots.latest(name)):
+                continue
+            history = self.cache.read('derived', name) if self.cache else None
+            if history is None:
+                if mode not in ('full', 'rebuild'):
+                    logger.warning(f"No full history of {name} to snapshot without the local cache")
+                    continue
+                history = df
+            try:
+                digest = partition_digests(history, self.BACKFILL_PARTITIONS[self.digest_partition]).get('*')
+                if digest == (self.snapshots.latest(name) or {}).get('digest'):
+                    continue  # re-uploaded, but the same content as the current version
+                versions[name] = self.snapshots.write(name, history, digest=digest)['version']
+            except Exception as e:
+                logger.warning(f"Could not write snapshot of {name}: {e}")
+        return versions
+
+    def _reset_analytics(self):
+        """Drop analytics watermarks so the next sync recomputes them over the whole history"""
+        if not self.cache:
+            return
         try:
-            # Rename for merging
-            df_oil = df_oil.rename(columns={'price': 'soybean_oil_price', 'basis': 'oil_basis'})
-            df_meal = df_meal.rename(columns={'price': 'soybean_meal_price', 'basis': 'meal_basis'})
-            df_bean = df_bean.rename(columns={'close': 'soybean_no2_price'})
-            
-            # Merge on date
-            df_merged = pd.merge(df_oil, df_meal, on='date', how='inner')
-            df_merged = pd.merge(df_merged, df_bean, on='date', how='inner')
-            
-            # 3. Calculate Margins
-            df_merged['spot_oil'] = df_merged['soybean_oil_price'] + df_merged['oil_basis']
-            df_merged['spot_meal'] = df_merged['soybean_meal_price'] + df_merged['meal_basis']
-            
-            df_merged['gross_margin'] = (df_merged['spot_oil'] * self.OIL_OUTPUT_RATE + 
-                                        df_merged['spot_meal'] * self.MEAL_OUTPUT_RATE) - \
-                                        (df_merged['soybean_no2_price'] + self.CRUSH_COST)
-                                        
-            # Futures Margin: (Y*0.185 + M*0.785) - (B0 + 150)
-            df_merged['futures_margin'] = (df_merged['soybean_oil_price'] * self.OIL_OUTPUT_RATE + 
-                                        df_merged['soybean_meal_price'] * self.MEAL_OUTPUT_RATE) - \
-                                        (df_merged['soybean_no2_price'] + self.CRUSH_COST)
-                                        
-            # Oil/Meal Ratio
-            df_merged['oil_meal_ratio'] = df_merged['spot_oil'] / df_merged['spot_meal']
+            state = self.cache.read_state('watermarks')
+            for output in self.registry.outputs:
+                if output['kind'] == 'analytics':
+                    state.pop(output['name'], None)
+            self.cache.write_state('watermarks', state)
         except Exception as e:
-            logger.error(f"Error processing/merging data: {e}")
-            return {"status": "error", "message": f"Processing fail: {e}"}
-        
-        # 4. Filter for Incremental Update
+            logger.warning(f"Could not reset analytics watermarks: {e}")
+
+    def _publish(self, frames, computed):
+        """Hand fresh series, spread and analytics rows to subscribers (e.g. the app's read store)"""
+        if not self.subscribers:
+            return
+        updates = [(key, df) for key, df in frames.items() if not df.empty]
+        for output, _, df in computed:
+            if df.empty:
+                continue
+            if output['kind'] == 'spread':
+                updates.append((output['name'], df))
+            elif output['kind'] == 'analytics':
+                updates += self._analytics_datasets(output, df)
+        for subscriber in self.subscribers:
+            for name, df in updates:
+                try:
+                    subscriber(name, df)
+                except Exception as e:
+                    logger.warning(f"Subscriber failed for {name}: {e}")
+
+    def _filter_after_latest_db_date(self, table, df):
+        """Keep only rows newer than the latest date already stored in `table`"""
+        date_column = self.registry.table(table).get('date_column', 'date')
         try:
-            print("DEBUG: Checking Supabase for latest date using curl...")
+            logger.info(f"Checking Supabase for latest {table} date...")
             # Supabase POSTGREST syntax: order=date.desc&limit=1
             params = {
-                "select": "date",
-                "order": "date.desc",
+                "select": date_column,
+                "order": f"{date_column}.desc",
                 "limit": "1"
             }
-            res = self._supabase_rest_request('GET', '/rest/v1/crush_margins', params=params)
+            res = self._supabase_rest_request('GET', f'/rest/v1/{table}', params=params)
             
             latest_db_date = None
             if isinstance(res, list) and len(res) > 0:
-                latest_db_date = pd.to_datetime(res[0]['date'])
+                latest_db_date = pd.to_datetime(res[0][date_column])
                 logger.info(f"Latest database date: {latest_db_date}")
             
             if latest_db_date:
-                new_records = df_merged[df_merged['date'] > latest_db_date]
-            else:
-                new_records = df_merged
+                return df[df['date'] > latest_db_date]
+            return df
         except Exception as e:
             logger.error(f"Supabase Read Error: {e}")
-            new_records = df_merged
+            return df
 
-        if new_records.empty:
-            logger.info("No new records to sync.")
-            return {"status": "success", "new_records": 0}
-        
-        # 5. Upsert to Supabase
-        records_to_insert = []
-        for _, row in new_records.iterrows():
-            # Convert NaNs to None for JSON
-            row = row.where(pd.notnull(row), None)
-            record = {
-                'date': row['date'].strftime('%Y-%m-%d'),
-                'soybean_oil_price': row['soybean_oil_price'],
-                'soybean_meal_price': row['soybean_meal_price'],
-                'soybean_no2_price': row['soybean_no2_price'],
-                'oil_basis': row['oil_basis'],
-                'meal_basis': row['meal_basis'],
-                'gross_margin': row['gross_margin'],
-                'futures_margin': row['futures_margin'],
-                'oil_meal_ratio': row['oil_meal_ratio'],
-                'updated_at': datetime.now().isoformat()
-            }
-            records_to_insert.append(record)
-        
-        # Batch upsert via REST
-        # POST to /rest/v1/crush_margins with Prefer: resolution=merge-duplicates (Upsert)
-        # Actually POST is insert. PATCH is update.
-        # But Supabase supports UPSERT via POST with "on_conflict" or "Prefer: resolution=merge-duplicates" header.
-        
-        url = f"{os.environ.get('NEXT_PUBLIC_SUPABASE_URL')}/rest/v1/crush_margins"
-        headers_extra = {
-             "Prefer": "resolution=merge-duplicates"
+    def _group_by_table(self, frames):
+        by_table = {}
+        for output, df in frames:
+            by_table.setdefault(output['table'], []).append(df)
+        return by_table
+
+    def _upload_table(self, table, parts):
+        """Serialize and bulk upsert the computed frames destined for one table"""
+        spec = self.registry.table(table)
+        date_column = spec.get('date_column', 'date')
+        df = pd.concat(parts, ignore_index=True).rename(columns={'date': date_column})
+        records = serialize_records(df, list(df.columns), date_columns=(date_column,),
+                                    updated_at=None if spec.get('updated_at') else False)
+        logger.info(f"Upserting {len(records)} records to {table}...")
+        return self.upsert_records(table, records, on_conflict=spec.get('on_conflict', date_column))
+
+    def _upload_outputs(self, frames):
+        """Bulk upsert computed outputs: one batched stream per table, tables in parallel.
+
+        Returns (stats per table, error message per failed table).
+        """
+        by_table = self._group_by_table(frames)
+        stats, errors = {}, {}
+        if not by_table:
+            return stats, errors
+        with ThreadPoolExecutor(max_workers=max(1, min(len(by_table), self.max_workers)),
+                                thread_name_prefix="upload") as pool:
+            futures = {table: pool.submit(self._upload_table, table, parts) for table, parts in by_table.items()}
+            for table, future in futures.items():
+                try:
+                    stats[table] = future.result()
+                except Exception as e:
+                    logger.error(f"Supabase Upsert Error ({table}): {e}")
+                    errors[table] = str(e)
+        return stats, errors
+
+    BACKFILL_PARTITIONS = {'year': 'Y', 'quarter': 'Q', 'month': 'M'}
+
+    @contextmanager
+    def exclusive_run(self):
+        """Yield True if no other sync/backfill is running, in this process or (via the cache dir) any other"""
+        if not self._run_lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            if self.cache:
+                with self.cache.exclusive('sync') as acquired:
+                    yield acquired
+            else:
+                yield True
+        finally:
+            self._run_lock.release()
+
+    def _busy(self):
+        logger.warning("Another sync or backfill is already running; skipping this run")
+        return {"status": "skipped", "message": "Another sync or backfill is already running"}
+
+    def backfill(self, start=None, end=None, partition='year', workers=None, resume=True, progress=None):
+        """Recompute and bulk-load every output's history between `start` and `end`.
+
+        Neither upstream accepts a date range, so each series is fetched once
+        (its full history, merged with older rows held in the local cache) and
+        the merged range is split into `partition` periods (year, quarter or
+        month). Partitions are computed and upserted in parallel on `workers`
+        threads (SYNC_BACKFILL_WORKERS, default 4). Finished partitions are
+        checkpointed in the cache, so re-running the same backfill after an
+        interruption skips them; `resume=False` starts over. Analytics outputs
+        are left to the next sync, which recomputes them over the whole history.
+        """
+        if partition not in self.BACKFILL_PARTITIONS:
+            raise ValueError(f"partition must be one of {', '.join(self.BACKFILL_PARTITIONS)}")
+        with self.exclusive_run() as acquired:
+            if not acquired:
+                return self._busy()
+            return self._backfill(start, end, partition, workers, resume, progress)
+
+    def _backfill(self, start, end, partition, workers, resume, progress):
+        workers = max(1, int(workers or os.environ.get("SYNC_BACKFILL_WORKERS", 4)))
+        progress = progress or (lambda stage, **info: None)
+        trace = RunTrace('backfill', self.metrics)
+        if not self.cache:
+            logger.warning("Local cache is disabled; backfill progress will not be checkpointed")
+
+        progress('fetch', series=len(self.registry.series))
+        with trace.span('fetch'):
+            frames, fetch_timings = self.fetch_series()
+        failed = sorted(key for key, df in frames.items() if df.empty)
+        # Rolling statistics need the whole history in order, so the next sync recomputes them instead
+        outputs = [o for o in self.registry.outputs
+                   if o['kind'] != 'analytics' and not any(key in failed for key in o['inputs'])]
+        if not outputs:
+            result = {"status": "error", "message": "Failed to fetch source data", "timings": fetch_timings}
+            result["metrics"] = trace.finish(result["status"])
+            return result
+
+        with trace.span('merge'):
+            wide = self.build_wide_frame(frames).loc[start:end]
+        partitions = [(str(period), part) for period, part in
+                      wide.groupby(wide.index.to_period(self.BACKFILL_PARTITIONS[partition]))]
+
+        # Checkpoints only carry over to an identical backfill (same range, partitioning and definitions)
+        key = json.dumps({'start': start, 'end': end, 'partition': partition,
+                          'outputs': {o['name']: self._output_fingerprint(o) for o in outputs}},
+                         sort_keys=True, default=str)
+        checkpoint = self.cache.read_state('backfill') if self.cache else {}
+        if not resume or checkpoint.get('key') != key:
+            checkpoint = {'key': key, 'done': {}, 'started_at': datetime.now().isoformat()}
+        resumed = [label for label, _ in partitions if label in checkpoint['done']]
+        pending = [(label, part) for label, part in partitions if label not in checkpoint['done']]
+        logger.info(f"Backfilling {len(partitions)} {partition} partition(s) "
+                    f"({len(resumed)} already done) with {workers} worker(s)")
+
+        def run(label, part):
+            with trace.span('partition', partition=label):
+                computed = [(o, self.compute_output(o, part)) for o in outputs]
+                return computed, {table: self._upload_table(table, parts) for table, parts
+                                  in self._group_by_table([c for c in computed if not c[1].empty]).items()}
+
+        lock = threading.Lock()
+        upload, errors, outputs_by_partition = {}, {}, {}
+        progress('backfill', done=len(resumed), total=len(partitions))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+            futures = {pool.submit(run, label, part): label for label, part in pending}
+            for future in as_completed(futures):
+                label = futures[future]
+                try:
+                    outputs_by_partition[label], stats = future.result()
+                except Exception as e:
+                    logger.error(f"Backfill partition {label} failed: {e}")
+                    errors[label] = str(e)
+                    continue
+                with lock:
+                    for table, table_stats in stats.items():
+                        total = upload.setdefault(table, {"rows": 0, "batches": 0, "bytes": 0})
+                        for k in total:
+                            total[k] += table_stats[k]
+                    checkpoint['done'][label] = {'rows': sum(t['rows'] for t in stats.values()),
+                                                 'finished_at': datetime.now().isoformat()}
+                    if self.cache:
+                        self.cache.write_state('backfill', checkpoint)
+                progress('backfill', done=len(checkpoint['done']), total=len(partitions))
+        trace.count('uploaded_rows', sum(t['rows'] for t in upload.values()))
+        trace.count('uploaded_bytes', sum(t['bytes'] for t in upload.values()))
+
+        snapshots = {}
+        if not errors:
+            # Whole range stored: refresh derived caches/watermarks and drop the checkpoint
+            with trace.span('save_watermarks'):
+                computed = self._assemble_backfill(outputs, partitions, outputs_by_partition, wide)
+                self._save_watermarks(computed)
+                self._reset_analytics()
+                freq = self.BACKFILL_PARTITIONS[self.digest_partition]
+                self._save_digests({('output', o['name']): {**partition_digests(df, freq), '*': self._definition_digest(o)}
+                                    for o, _, df in computed})
+                if self.cache:
+                    self.cache.write_state('backfill', {})
+            with trace.span('snapshot'):
+                snapshots = self._write_snapshots(computed, {o['name'] for o in outputs})
+            self._publish(frames, computed)
+
+        result = {
+            "status": "success" if not (errors or failed) else ("partial" if upload or resumed else "error"),
+            "partitions": {"total": len(partitions), "completed": len(pending) - len(errors),
+                           "resumed": len(resumed), "failed": sorted(errors)},
+            "range": [str(wide.index.min().date()), str(wide.index.max().date())] if len(wide) else None,
+            "timings": fetch_timings,
+            "upload": upload,
         }
-        
-        # We need to pass extra headers to our helper, but helper design is simple.
-        # Let's just modify helper to accept 'Prefer' or use strict POST.
-        # Actually, let's just do it manually here or enhance helper.
-        # I'll manually call helper but adding Prefer to headers inside helper is better if configurable.
-        
-        # Refactoring helper call to upsert
-        logger.info(f"Upserting {len(records_to_insert)} records to Supabase...")
-        
-        # Split into chunks of 100 to avoid command line length limits on Windows
-        chunk_size = 50
-        for i in range(0, len(records_to_insert), chunk_size):
-            chunk = records_to_insert[i:i+chunk_size]
-            
-            # Using query param on_conflict if needed? standard generic upsert is usually:
-            # POST /table?on_conflict=date
-            # Header: Prefer: resolution=merge-duplicates
-            
-            upsert_params = {"on_conflict": "date"}
-             # We need to hack the helper to support custom headers? 
-             # I'll just hardcode the header in helper if I can't pass it.
-             # Wait, I can pass method=POST and rely on default behavior
-             # But 'resolution=merge-duplicates' is needed for upsert.
-            
-            # For now, let's just use INSERT (POST). Since we filter by date > latest, it should be fine as insert.
-            # But if we re-run, might duplicate if PK not enforced?
-            # Date is PK (or unique).
-            # If Date is PK, POST will fail on duplicate.
-            # Let's try normal POST. If we truly filtered > latest, it shouldn't conflict.
-            
-            self._supabase_rest_request('POST', '/rest/v1/crush_margins', body=chunk)
-            
-        logger.info(f"Successfully upserted {len(records_to_insert)} records.")
-        return {"status": "success", "new_records": len(records_to_insert)}
+        if snapshots:
+            result["snapshots"] = snapshots
+        if failed:
+            result["failed_sources"] = failed
+        if errors:
+            result["message"] = f"{len(errors)} partition(s) failed; re-run the same backfill to resume"
+        result["metrics"] = trace.finish(result["status"])
+        logger.info(f"Backfill finished: {result['partitions']}")
+        return result
+
+    def _assemble_backfill(self, outputs, partitions, outputs_by_partition, wide):
+        """Whole-range (output, 'backfill', rows) from the per-partition outputs, in date order.
+
+        Series and spread outputs are evaluated row by row, so the partitions'
+        rows end to end are the whole range's. Only partitions finished by an
+        earlier, interrupted run of the same backfill are computed here.
+        """
+        by_partition = [outputs_by_partition.get(label) or [(o, self.compute_output(o, part)) for o in outputs]
+                        for label, part in partitions]
+        computed = []
+        for i, output in enumerate(outputs):
+            parts = [computed_part[i][1] for computed_part in by_partition if not computed_part[i][1].empty]
+            df = pd.concat(parts, ignore_index=True) if parts else self.compute_output(output, wide.iloc[:0])
+            computed.append((output, 'backfill', df))
+        return computed
+
+    def sync_data(self, rebuild=False, progress=None, profile_dir=None, series=None, skip_unchanged=True):
+        """Main execution flow: Fetch, Merge, Calculate, Upsert for every registered output
+
+        By default each output only merges and computes the rows from its
+        stored watermark on, rewound to the earliest date partition in which an
+        input's content digest changed, and uploads only the partitions whose
+        own digest changed; so upstream revisions of old rows are corrected
+        without rewriting whole tables. `rebuild=True` recomputes and
+        re-upserts the full history, e.g. after changing CRUSH_COST or the
+        output rates.
+        `progress(stage, **info)` is called as the run moves between stages.
+        The result's "metrics" entry holds the run's stage spans and totals;
+        `profile_dir` (or SYNC_PROFILE_DIR) turns on cProfile for the run.
+
+        `series` limits the upstream refresh to those keys; the others come
+        from their resident (or cached) copy. A run whose refreshed series and
+        output definitions all match their stored digests stops before merge
+        and compute ("unchanged"); pass `skip_unchanged=False` to compute
+        anyway. Runs never overlap: a second concurrent call returns "skipped".
+        """
+        kind = 'rebuild' if rebuild else 'sync'
+        trace = RunTrace(kind, self.metrics)
+        with self.exclusive_run() as acquired:
+            if not acquired:
+                result = self._busy()
+            else:
+                with profiled(kind, profile_dir):
+                    result = self._sync(trace, rebuild, progress or (lambda stage, **info: None),
+                                        series, skip_unchanged)
+        result["metrics"] = trace.finish(result["status"])
+        return result
+
+    def _refresh_keys(self, series):
+        """Keys to fetch upstream this run: `series`, plus any series with no resident/cached copy yet"""
+        if series is None:
+            return None
+        refresh = set(series)
+        for entry in self.registry.series:
+            key = entry['key']
+            if key in refresh or key in self.resident:
+                continue
+            cached = self.cache.read(entry['source'], entry['symbol']) if self.cache else None
+            if cached is not None and not cached.empty:
+                self.resident[key] = cached
+            else:
+                refresh.add(key)
+        return refresh
+
+    def _load_digests(self):
+        """Stored digests as {(scope, name): {period: digest}}, or None when the table can't be read"""
+        stored, offset = {}, 0
+        while True:
+            rows = self._supabase_rest_request('GET', f'/rest/v1/{self.digest_table}', params={
+                'select': 'scope,name,period,digest',
+                'order': 'scope,name,period',
+                'offset': str(offset),
+                'limit': '1000',
+            })
+            if not isinstance(rows, list):
+                logger.warning(f"Could not read {self.digest_table}; change detection is off for this run")
+                return None
+            if not rows:
+                return stored
+            try:
+                for row in rows:
+                    stored.setdefault((row['scope'], row['name']), {})[row['period']] = row['digest']
+            except (KeyError, TypeError) as e:
+                logger.warning(f"Unexpected rows in {self.digest_table} ({e}); change detection is off for this run")
+                return None
+            offset += len(rows)
+
+    def _save_digests(self, digests):
+        """Upsert {(scope, name): {period: digest}}; a failure only costs re-uploads next run"""
+        updated_at = datetime.now().isoformat()
+        records = [{'scope': scope, 'name': name, 'period': period, 'digest': digest, 'updated_at': updated_at}
+                   for (scope, name), periods in digests.items() for period, digest in periods.items()]
+        if not records:
+            return
+        try:
+            self.upsert_records(self.digest_table, records, on_conflict='scope,name,period')
+        except Exception as e:
+            logger.warning(f"Could not store content digests: {e}")
+
+    def _definition_digest(self, output):
+        """Digest of an output's definition, stored as its '*' period"""
+        fingerprint = json.dumps(self._output_fingerprint(output), sort_keys=True, default=str)
+        return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:16]
+
+    def _unchanged(self, stored, series_digests):
+        """True when every refreshed series and every output definition matches its stored digest"""
+        return all(stored.get(('series', key), {}).get('*') == digests['*']
+                   for key, digests in series_digests.items()) and \
+            all(stored.get(('output', o['name']), {}).get('*') == self._definition_digest(o)
+                for o in self.registry.outputs)
+
+    def _revised_since(self, stored, series_digests):
+        """{series key: start of its earliest period whose digest differs from the stored one}"""
+        freq = self.BACKFILL_PARTITIONS[self.digest_partition]
+        revised = {}
+        for key, digests in series_digests.items():
+            previous = stored.get(('series', key))
+            if not previous:
+                continue  # no baseline yet: fall back to the watermark alone
+            changed = [period for period, digest in digests.items() if period != '*' and previous.get(period) != digest]
+            if changed:
+                revised[key] = min(pd.Period(period, freq).start_time for period in changed)
+        return revised
+
+    def _sync(self, trace, rebuild, progress, series=None, skip_unchanged=False):
+        logger.info(f"Starting sync_data ({'rebuild' if rebuild else 'incremental'})")
+        refresh = self._refresh_keys(series)
+        progress('fetch', series=len(refresh) if refresh is not None else len(self.registry.series))
+
+        # 1. Fetch every registered series (concurrently, bounded by the slowest source)
+        with trace.span('fetch'):
+            frames, fetch_timings = self.fetch_series(refresh, refresh=series is not None)
+        fetched = sum(1 for df in frames.values() if not df.empty)
+        trace.count('fetched_rows', sum(len(df) for df in frames.values()))
+        logger.info(f"Fetched {fetched}/{len(frames)} series in {fetch_timings['total']}s")
+
+        if not fetched:
+            logger.error("All data sources failed. Aborting sync.")
+            return {"status": "error", "message": "Failed to fetch source data", "timings": fetch_timings,
+                    "breakers": self.breakers.snapshot()}
+        fresh = {key: df for key, df in frames.items() if not df.empty}
+        self.resident.update(fresh)
+        for key, df in self.resident.items():
+            frames.setdefault(key, df)
+
+        # Lagging/dead sources: spreads continue on their last-known-good cached series
+        stale = self._fallback_to_cache(frames)
+        failed = sorted(key for key, df in frames.items() if df.empty)
+        if failed:
+            logger.error(f"Data sources failed: {', '.join(failed)}; skipping outputs that depend on them")
+
+        # 2. Compare content digests with the stored ones: stop if nothing changed, else find revised periods
+        freq = self.BACKFILL_PARTITIONS[self.digest_partition]
+        with trace.span('digest'):
+            stored = {} if rebuild else self._load_digests()
+            series_digests = {key: partition_digests(df, freq) for key, df in fresh.items()}
+        if skip_unchanged and stored and not (rebuild or failed or stale) and \
+                self._unchanged(stored, series_digests):
+            logger.info("Upstream data unchanged since the last stored run; skipping compute and upload")
+            return {"status": "unchanged", "new_records": 0, "timings": fetch_timings}
+        revised = self._revised_since(stored or {}, series_digests)
+
+        # 3. Pick compute mode per output: incremental from its watermark (or first revision), or full history
+        progress('compute', fetched=fetched, failed=failed, stale=stale)
+        plans, skipped = self._plan_outputs(failed, rebuild, stale, revised)
+
+        # 4. Merge (only rows after the oldest watermark) and calculate all outputs, across the shard
+        #    worker processes when enabled; keep only the partitions whose digest differs from the stored one
+        to_upload, output_digests, changed = [], {}, {}
+        try:
+            computed = self._compute_plans(plans, frames, stale, trace)
+            for output, mode, df in computed:
+                digests = output_digests[output['name']] = partition_digests(df, freq)
+                digests['*'] = self._definition_digest(output)
+                previous = (stored or {}).get(('output', output['name']))
+                if previous and mode != 'rebuild':
+                    periods = [p for p, d in digests.items() if p != '*' and previous.get(p) != d]
+                    changed[output['name']] = len(periods)
+                    df = in_periods(df, periods, freq)
+                elif mode == 'full' and not output['key']:
+                    # No watermark or digests yet: fall back to the newest date already in the table
+                    with trace.span('watermark_query', table=output['table']):
+                        df = self._filter_after_latest_db_date(output['table'], df)
+                if not df.empty:
+                    to_upload.append((output, df))
+            trace.count('changed_partitions', sum(changed.values()))
+        except Exception as e:
+            logger.error(f"Error processing/merging data: {e}")
+            return {"status": "error", "message": f"Processing fail: {e}", "timings": fetch_timings}
+
+        # 5. Bulk upsert, one stream per table
+        progress('upload', outputs=len(to_upload), rows=sum(len(df) for _, df in to_upload))
+        with trace.span('upload'):
+            upload, errors = self._upload_outputs(to_upload)
+        trace.count('uploaded_rows', sum(stats['rows'] for stats in upload.values()))
+        trace.count('uploaded_bytes', sum(stats['bytes'] for stats in upload.values()))
+        trace.count('upload_batches', sum(stats['batches'] for stats in upload.values()))
+
+        # 6. Advance watermarks and digests only for outputs that are safely stored. Series digests
+        #    are the baseline for spotting revisions, so they wait until every dependent output is stored
+        saved = [c for c in computed if c[0]['table'] not in errors]
+        with trace.span('save_watermarks'):
+            self._save_watermarks(saved)
+        new_digests = {('output', o['name']): output_digests[o['name']] for o, _, _ in saved}
+        if stored is not None and not (errors or failed):
+            new_digests.update({('series', key): digests for key, digests in series_digests.items()})
+        with trace.span('save_digests'):
+            self._save_digests({k: {p: d for p, d in digests.items() if (stored or {}).get(k, {}).get(p) != d}
+                                for k, digests in new_digests.items()})
+        uploaded = {o['name']: len(df) for o, df in to_upload if o['table'] not in errors}
+        with trace.span('snapshot'):
+            snapshots = self._write_snapshots(saved, uploaded)
+        with trace.span('publish'):
+            self._publish(frames, saved)
+
+        modes = {mode for _, mode, _ in plans}
+        result = {
+            "status": "success",
+            "new_records": uploaded.get('crush_margins', 0),
+            "mode": modes.pop() if len(modes) == 1 else 'mixed',
+            "outputs": {o['name']: {"mode": mode, "rows": uploaded.get(o['name'], 0),
+                                    **({"changed_partitions": changed[o['name']]} if o['name'] in changed else {})}
+                        for o, mode, _ in plans},
+            "timings": fetch_timings,
+            "upload": upload,
+        }
+        if snapshots:
+            result["snapshots"] = snapshots
+        if failed or stale or skipped or errors:
+            result["status"] = "partial" if uploaded else "error"
+            result["failed_sources"] = failed
+            result["stale_sources"] = stale
+            result["skipped_outputs"] = skipped
+            result["breakers"] = self.breakers.snapshot()
+            if errors:
+                result["message"] = "; ".join(f"{t}: {m}" for t, m in errors.items())
+        logger.info(f"Sync finished: {uploaded}")
+        return result
         
         # try:
         #     res = self.supabase.table('crush_margins').select('date').order('date', desc=True).limit(1).execute()
@@ -442,4 +1737,4 @@ if __name__ == "__main__":
     from dotenv import load_dotenv
     load_dotenv()
     engine = DataEngine()
-    print(engine.sync_data())
+    print(engine.sync_data(rebuild='--rebuild' in sys.argv))
@@ -0,0 +1,110 @@
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class JobManager:
+    """In-process background job queue with coalescing and status polling.
+
+    Jobs run on a small thread pool. Submitting a job whose `coalesce_key`
+    matches a queued or running job returns that job instead of starting a
+    duplicate. Job functions receive a `progress(stage, **info)` callback;
+    every stage change is timestamped so /jobs/<id> can show where time went.
+    Finished jobs are kept (up to `history`) for polling.
+    """
+
+    def __init__(self, max_workers=1, history=100):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.history = history
+        self._jobs = OrderedDict()
+        self._active = {}  # coalesce_key -> job id
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, coalesce_key=None):
+        """Queue fn(progress) and return (job snapshot, created)"""
+        with self._lock:
+            if coalesce_key is not None and coalesce_key in self._active:
+                job = self._jobs[self._active[coalesce_key]]
+                job['coalesced'] += 1
+                return self._snapshot(job), False
+
+            job = {
+                'id': uuid.uuid4().hex,
+                'kind': kind,
+                'status': 'queued',
+                'stage': None,
+                'progress': {},
+                'timings': {},
+                'result': None,
+                'error': None,
+                'coalesced': 0,
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+            }
+            self._jobs[job['id']] = job
+            if coalesce_key is not None:
+                self._active[coalesce_key] = job['id']
+            self._trim()
+
+        self.executor.submit(self._run, job, fn, coalesce_key)
+        return self._snapshot(job), True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def list(self):
+        with self._lock:
+            return [self._snapshot(job) for job in reversed(self._jobs.values())]
+
+    def _run(self, job, fn, coalesce_key):
+        stage_started = [time.monotonic()]
+
+        def progress(stage, **info):
+            now = time.monotonic()
+            with self._lock:
+                if job['stage'] is not None:
+                    job['timings'][job['stage']] = round(now - stage_started[0], 3)
+                job['stage'] = stage
+                job['progress'] = info
+                stage_started[0] = now
+
+        with self._lock:
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+        try:
+            result = fn(progress)
+            status = 'failed' if isinstance(result, dict) and result.get('status') == 'error' else 'succeeded'
+            error = result.get('message') if status == 'failed' else None
+        except Exception as e:
+            logger.exception(f"Job {job['id']} ({job['kind']}) crashed")
+            result, status, error = None, 'failed', str(e)
+
+        with self._lock:
+            if job['stage'] is not None:
+                job['timings'][job['stage']] = round(time.monotonic() - stage_started[0], 3)
+            job['status'] = status
+            job['result'] = result
+            job['error'] = error
+            job['finished_at'] = time.time()
+            job['timings']['total'] = round(job['finished_at'] - job['started_at'], 3)
+            if coalesce_key is not None and self._active.get(coalesce_key) == job['id']:
+                del self._active[coalesce_key]
+
+    def _trim(self):
+        finished = [jid for jid, job in self._jobs.items() if job['finished_at'] is not None]
+        for jid in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[jid]
+
+    def _snapshot(self, job):
+        snapshot = dict(job)
+        snapshot['progress'] = dict(job['progress'])
+        snapshot['timings'] = dict(job['timings'])
+        return snapshot
@@ -0,0 +1,55 @@
+import sys
+import threading
+import importlib
+import importlib.util
+
+
+class _LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    The first access imports the module under a lock, so threads that touch
+    it at the same moment all wait for one complete import (importlib's
+    LazyLoader is not thread-safe before Python 3.12: concurrent first
+    accesses can see a half-initialized module).
+    """
+
+    def __init__(self, name):
+        self._lazy_name = name
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+
+    def _lazy_load(self):
+        module = self._lazy_module
+        if module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self._lazy_name)
+                module = self._lazy_module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._lazy_load(), attr)
+
+    def __dir__(self):
+        return dir(self._lazy_load())
+
+    def __repr__(self):
+        state = 'loaded' if self._lazy_module is not None else 'not loaded'
+        return f"<lazy module {self._lazy_name!r} ({state})>"
+
+
+def lazy_import(name):
+    """Module `name`, imported only on first attribute access.
+
+    Used for the heavy dependencies (pandas, numpy, pyarrow, requests) so that
+    importing app.py or schedule_runner.py stays cheap and only the code
+    paths that actually touch a dependency pay for loading it. Returns the
+    real module when it is already imported; raises ModuleNotFoundError up
+    front when it is not installed.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    return _LazyModule(name)
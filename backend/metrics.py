@@ -0,0 +1,210 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a fast cache hit up to a slow full-history upload
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms, rendered in Prometheus text format.
+
+    Metric names and their help text are declared on first use; label values
+    are free-form. The process-wide registry is `REGISTRY`.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._types = {}
+        self._help = {}
+        self._values = {}      # (name, labels) -> float, for counters and gauges
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def _declare(self, name, kind, help):
+        declared = self._types.setdefault(name, kind)
+        if declared != kind:
+            raise ValueError(f"Metric {name} is a {declared}, not a {kind}")
+        if help:
+            self._help.setdefault(name, help)
+
+    def inc(self, name, value=1, help=None, **labels):
+        with self._lock:
+            self._declare(name, 'counter', help)
+            key = (name, _label_key(labels))
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, help=None, **labels):
+        with self._lock:
+            self._declare(name, 'gauge', help)
+            self._values[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, help=None, **labels):
+        with self._lock:
+            self._declare(name, 'histogram', help)
+            key = (name, _label_key(labels))
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    @contextmanager
+    def timer(self, name, help=None, **labels):
+        """Observe the duration of the block into histogram `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, help, **labels)
+
+    def value(self, name, **labels):
+        """Current counter/gauge value, or the observation count of a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            if key in self._histograms:
+                return self._histograms[key][-1]
+            return self._values.get(key, 0)
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+            types, helps = dict(self._types), dict(self._help)
+
+        lines = []
+        for name in sorted(types):
+            if name in helps:
+                lines.append(f"# HELP {name} {helps[name]}")
+            lines.append(f"# TYPE {name} {types[name]}")
+            if types[name] == 'histogram':
+                for (metric, key), hist in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(self.buckets + (float('inf'),), hist[:-2] + [hist[-1]]):
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(hist[-2])}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist[-1]}")
+            else:
+                for (metric, key), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Metrics()
+
+
+class RunTrace:
+    """Timing spans for one pipeline run.
+
+    Each span is kept for the run's JSON summary and also observed into the
+    `dataview_stage_seconds{stage=...}` histogram of the registry.
+    """
+
+    def __init__(self, kind, registry=None):
+        self.kind = kind
+        self.registry = registry or REGISTRY
+        self.started_at = datetime.now().isoformat()
+        self.spans = []
+        self.counts = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.spans.append({'stage': stage, **labels, 'seconds': round(elapsed, 4)})
+            self.registry.observe('dataview_stage_seconds', elapsed,
+                                  help='Duration of sync pipeline stages', stage=stage)
+
+    def count(self, name, value=1):
+        """Add to a per-run total that shows up in the summary (rows, bytes, ...)"""
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def finish(self, status):
+        """Record the run's outcome and return its JSON-serializable summary"""
+        elapsed = time.perf_counter() - self._start
+        self.registry.inc('dataview_runs_total', help='Pipeline runs by kind and final status',
+                          kind=self.kind, status=status)
+        self.registry.observe('dataview_run_seconds', elapsed, help='Total pipeline run duration', kind=self.kind)
+        self.registry.set('dataview_last_run_timestamp_seconds', time.time(),
+                          help='Unix time the last run finished', kind=self.kind, status=status)
+        stages = {}
+        for span in self.spans:
+            stages[span['stage']] = round(stages.get(span['stage'], 0) + span['seconds'], 4)
+        return {
+            'kind': self.kind,
+            'status': status,
+            'started_at': self.started_at,
+            'seconds': round(elapsed, 4),
+            'stages': stages,
+            'spans': list(self.spans),
+            'counts': dict(self.counts),
+        }
+
+
+@contextmanager
+def profiled(name, directory=None, top=25):
+    """cProfile the block when `directory` (or SYNC_PROFILE_DIR) is set.
+
+    Stats are dumped to <directory>/<name>-<timestamp>.prof (open with
+    snakeviz or pstats) and the top entries by cumulative time are logged.
+    """
+    directory = directory or os.environ.get('SYNC_PROFILE_DIR')
+    if not directory:
+        yield None
+        return
+
+    import io
+    import pstats
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.prof")
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(top)
+            logger.info(f"Profile written to {path}\n{out.getvalue()}")
+        except Exception as e:
+            logger.warning(f"Could not write profile for {name}: {e}")
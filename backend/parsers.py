@@ -0,0 +1,132 @@
+import re
+import json
+from datetime import datetime
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Sina rows look like {"d":"2024-01-02","o":"4500","h":"4530","l":"4490","c":"4520","v":"1234"}
+_SINA_DATE = re.compile(rb'"d"\s*:\s*"(\d{4}-\d{2}-\d{2})')
+_SINA_CLOSE = re.compile(rb'"c"\s*:\s*"?(-?[0-9][0-9.eE+-]*)')
+
+
+def iso_dates_to_days(raw):
+    """b'YYYY-MM-DD' strings (a list or one concatenated buffer) -> int64 days since epoch"""
+    if isinstance(raw, list):
+        raw = b''.join(raw)
+    return np.frombuffer(raw, dtype='S10').astype('datetime64[D]').astype(np.int64)
+
+
+def to_frame(dates, **columns):
+    """Wrap parsed column arrays (dates as int64 epoch days) in a date-sorted DataFrame"""
+    if not len(dates):
+        return pd.DataFrame()
+    order = None if np.all(dates[1:] >= dates[:-1]) else np.argsort(dates, kind='stable')
+    if order is not None:
+        dates = dates[order]
+        columns = {k: v[order] for k, v in columns.items()}
+    return pd.DataFrame({'date': dates.astype('datetime64[D]').astype('datetime64[ns]'), **columns})
+
+
+class SinaKlineParser:
+    """Incremental parser for Sina's JSONP daily K-line payload.
+
+    feed() accepts body chunks as they arrive; only complete `{...}` row objects
+    are scanned, the unfinished tail is carried over. Dates and closes are
+    pulled out with two regex passes per chunk and collected as raw bytes, then
+    converted once to int64 epoch days / float64 in finish(). No per-row dicts
+    or intermediate JSON tree are built.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+        self._dates = []
+        self._closes = []
+
+    def feed(self, chunk):
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = self._buffer + chunk
+        end = data.rfind(b'}')
+        if end == -1:
+            self._buffer = data
+            return
+        self._scan(data[:end + 1])
+        self._buffer = data[end + 1:]
+
+    def _scan(self, data):
+        dates = _SINA_DATE.findall(data)
+        closes = _SINA_CLOSE.findall(data)
+        if len(dates) != len(closes):
+            raise ValueError(f"Sina payload rows are missing fields ({len(dates)} dates, {len(closes)} closes)")
+        self._dates.extend(dates)
+        self._closes.extend(closes)
+
+    def finish(self):
+        """Return (dates as int64 epoch days, closes as float64)"""
+        if self._buffer.strip():
+            self._scan(self._buffer)
+            self._buffer = b''
+        if not self._dates:
+            return np.empty(0, np.int64), np.empty(0, np.float64)
+        return iso_dates_to_days(self._dates), np.array(self._closes, dtype=np.float64)
+
+
+def parse_sina_kline(payload):
+    """Parse a complete Sina payload; see SinaKlineParser"""
+    parser = SinaKlineParser()
+    parser.feed(payload)
+    return parser.finish()
+
+
+def infer_mmdd_years(month, today=None):
+    """Year for MM-DD dates: the current year, or last year for months still ahead of today"""
+    today = today or datetime.now()
+    return np.where(month > today.month, today.year - 1, today.year)
+
+
+def parse_jiaoyifamen_dates(dates, today=None):
+    """Jiaoyifamen category labels ('MM-DD' or 'YYYY-MM-DD') -> int64 epoch days, vectorized"""
+    labels = np.asarray(dates, dtype='U10')
+    result = np.full(len(labels), np.iinfo(np.int64).min, dtype=np.int64)  # NaT
+
+    short = (np.char.str_len(labels) <= 5) & (np.char.find(labels, '-') >= 0)
+    if short.any():
+        parts = np.char.partition(labels[short], '-')
+        month = parts[:, 0].astype(np.int64)
+        day = parts[:, 2].astype(np.int64)
+        year = infer_mmdd_years(month, today)
+        month_start = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1).astype('timedelta64[M]')
+        days = month_start.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+        # Reject impossible dates (e.g. 02-29 in a non-leap year) like pd.to_datetime would
+        valid = (month >= 1) & (month <= 12) & (day >= 1) & (days.astype('datetime64[M]') == month_start)
+        result[short] = np.where(valid, days.astype(np.int64), np.iinfo(np.int64).min)
+    if (~short).any():
+        result[~short] = pd.to_datetime(labels[~short], errors='coerce').to_numpy('datetime64[D]').astype(np.int64)
+    return result
+
+
+def parse_jiaoyifamen(payload, today=None):
+    """Jiaoyifamen future-basis JSON -> (dates as int64 epoch days, price float64, basis float64).
+
+    The payload is already columnar (category/price/basis arrays), so the arrays
+    are converted directly; rows with an unparseable date or value are dropped.
+    """
+    data = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+    raw = (data or {}).get('data') or {}
+    keys = list(raw.keys())
+    cat_key = next((k for k in keys if 'category' in k.lower()), None)
+    price_key = next((k for k in keys if 'price' in k.lower()), None)
+    basis_key = next((k for k in keys if 'basis' in k.lower()), None)
+    if not (cat_key and price_key and basis_key):
+        return None
+
+    n = min(len(raw[cat_key]), len(raw[price_key]), len(raw[basis_key]))
+    dates = parse_jiaoyifamen_dates(raw[cat_key][:n], today)
+    price = pd.to_numeric(pd.Series(raw[price_key][:n], dtype=object), errors='coerce').to_numpy(np.float64)
+    basis = pd.to_numeric(pd.Series(raw[basis_key][:n], dtype=object), errors='coerce').to_numpy(np.float64)
+
+    keep = (dates != np.iinfo(np.int64).min) & ~np.isnan(price) & ~np.isnan(basis)
+    return dates[keep], price[keep], basis[keep]
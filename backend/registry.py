@@ -0,0 +1,110 @@
+import os
+import re
+import json
+
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sync_registry.json')
+
+DEFAULT_WINDOWS = (20, 60, 250)
+
+_PARAM = re.compile(r'@(\w+)')
+_NAME = re.compile(r'(?<![@\w])([A-Za-z_]\w*)\b(?!\s*\()')
+
+
+class Registry:
+    """Symbols and derived spreads synced by DataEngine (sync_registry.json).
+
+    `series` lists what to fetch: a unique `key`, the upstream `source`
+    (a DataEngine fetcher name) and its `symbol`. Fetched columns are exposed
+    to expressions as `<key>_<column>`, e.g. `Y_price`, `Y_basis`, `B0_close`.
+
+    Every output, whether a series' own `writes` or a `spreads` entry, is
+    normalized to {name, kind, table, key, columns, params, inputs, fields}: `key` holds
+    constant columns (e.g. symbol), `columns` maps output columns to
+    DataFrame.eval expressions, and `@NAME` refers to `params` or to a
+    DataEngine attribute such as CRUSH_COST.
+
+    `analytics` entries add rolling statistics (analytics.py) of some columns
+    of another output: {name, table, source: output name, metrics: [columns],
+    windows: [rows]}. They become outputs of kind 'analytics' whose `columns`
+    are the source's expressions for those metrics, written one row per
+    (metric, date).
+
+    `schedules` maps a source to cron expressions (in `timezone`) for the
+    resident scheduler, e.g. shortly after the exchange's day and night closes.
+
+    Set SYNC_REGISTRY to use a different file.
+    """
+
+    def __init__(self, config):
+        self.tables = config.get('tables', {})
+        self.series = config.get('series', [])
+        self.schedules = config.get('schedules', {})
+        self.timezone = config.get('timezone', 'Asia/Shanghai')
+        self.outputs = []
+
+        keys = [s['key'] for s in self.series]
+        if len(set(keys)) != len(keys):
+            raise ValueError("Duplicate series keys in sync registry")
+        self.keys = keys
+
+        for series in self.series:
+            for write in series.get('writes', []):
+                key_values = write.get('key', {})
+                name = f"{write['table']}:{series['key']}"
+                columns = {col: f"{series['key']}_{src}" for col, src in write['columns'].items()}
+                self._add_output(name, write['table'], key_values, columns, {}, kind='series')
+
+        for spread in config.get('spreads', []):
+            self._add_output(spread['name'], spread['table'], spread.get('key', {}),
+                             spread['columns'], spread.get('params', {}), kind='spread')
+
+        for spec in config.get('analytics', []):
+            source = self.output(spec['source'])
+            if source is None:
+                raise ValueError(f"Analytics {spec['name']} reads unknown output {spec['source']}")
+            metrics = spec.get('metrics') or list(source['columns'])
+            unknown = [m for m in metrics if m not in source['columns']]
+            if unknown:
+                raise ValueError(f"Analytics {spec['name']}: {source['name']} has no column {', '.join(unknown)}")
+            self._add_output(spec['name'], spec['table'], {}, {m: source['columns'][m] for m in metrics},
+                             source['params'], kind='analytics')
+            self.outputs[-1]['windows'] = sorted(spec.get('windows', DEFAULT_WINDOWS))
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or os.environ.get("SYNC_REGISTRY") or DEFAULT_REGISTRY_PATH
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _add_output(self, name, table, key, columns, params, kind):
+        if table not in self.tables:
+            raise ValueError(f"Output {name} writes to unknown table {table}")
+        if any(o['name'] == name for o in self.outputs):
+            raise ValueError(f"Duplicate output name {name} in sync registry")
+
+        inputs, fields = set(), set()
+        for expr in columns.values():
+            for token in _NAME.findall(_PARAM.sub(' ', expr)):
+                series_key = next((k for k in self.keys if token.startswith(f"{k}_")), None)
+                if series_key is None:
+                    raise ValueError(f"Output {name} references unknown column {token}")
+                inputs.add(series_key)
+                fields.add(token)
+
+        self.outputs.append({
+            'name': name,
+            'kind': kind,
+            'table': table,
+            'key': key,
+            'columns': columns,
+            'params': params,
+            'param_names': sorted({p for expr in columns.values() for p in _PARAM.findall(expr)}),
+            'inputs': sorted(inputs),
+            'fields': sorted(fields),
+        })
+
+    def table(self, name):
+        return self.tables[name]
+
+    def output(self, name):
+        return next((o for o in self.outputs if o['name'] == name), None)
@@ -0,0 +1,102 @@
+import time
+import random
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retries(fn, attempts=3, deadline=None, base=1.0, cap=30.0, ok=None, sleep=time.sleep):
+    """Call fn() until ok(result), at most `attempts` times, never sleeping past `deadline`.
+
+    `deadline` is a time.monotonic() value. Exceptions count as failed
+    attempts; the last one is re-raised. Returns the last result otherwise.
+    """
+    ok = ok or (lambda result: True)
+    result, error = None, None
+    for attempt in range(max(1, attempts)):
+        try:
+            result, error = fn(), None
+            if ok(result):
+                return result
+        except Exception as e:
+            error = e
+        if attempt + 1 >= attempts:
+            break
+        delay = backoff_delay(attempt, base, cap)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            break
+        sleep(delay)
+    if error is not None:
+        raise error
+    return result
+
+
+class CircuitBreakers:
+    """Per-source circuit breakers, persisted so separate scheduler runs share them.
+
+    A source's breaker opens after `threshold` consecutive failed fetches;
+    while open, fetches fail fast with CircuitOpenError. After `cooldown`
+    seconds one trial fetch is let through (half-open): success closes the
+    breaker, failure re-opens it for another cooldown. State lives in the
+    series cache's `breakers` state file when a cache is given.
+    """
+
+    def __init__(self, cache=None, threshold=3, cooldown=1800.0):
+        self.cache = cache
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._state = cache.read_state('breakers') if cache else {}
+
+    def _save(self):
+        if self.cache:
+            try:
+                self.cache.write_state('breakers', self._state)
+            except Exception as e:
+                logger.warning(f"Could not persist circuit breaker state: {e}")
+
+    def state(self, name):
+        """'closed', 'open' or 'half_open'"""
+        with self._lock:
+            entry = self._state.get(name) or {}
+        opened_at = entry.get('opened_at')
+        if opened_at is None:
+            return 'closed'
+        return 'half_open' if time.time() - opened_at >= self.cooldown else 'open'
+
+    def allow(self, name):
+        return self.state(name) != 'open'
+
+    def record_success(self, name):
+        with self._lock:
+            if self._state.pop(name, None) is None:
+                return
+            self._save()
+        logger.info(f"Circuit for {name} closed")
+
+    def record_failure(self, name):
+        with self._lock:
+            entry = self._state.setdefault(name, {'failures': 0, 'opened_at': None})
+            entry['failures'] += 1
+            half_open = entry['opened_at'] is not None
+            if half_open or entry['failures'] >= self.threshold:
+                entry['opened_at'] = time.time()
+            self._save()
+        if entry['opened_at'] is not None:
+            logger.warning(f"Circuit for {name} open after {entry['failures']} consecutive failure(s); "
+                           f"skipping it for {self.cooldown:.0f}s")
+
+    def snapshot(self):
+        with self._lock:
+            names = list(self._state)
+        return {name: self.state(name) for name in names}
@@ -1,7 +1,13 @@
 
 import os
+import sys
+import json
 import logging
+import signal
+import argparse
 from data_engine import DataEngine
+from metrics import profiled
+from scheduler import Scheduler
 
 # Configure logging
 logging.basicConfig(
@@ -14,15 +20,71 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def main():
-    logger.info("Starting scheduled data sync...")
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Scheduled DataView sync")
+    parser.add_argument('command', nargs='?', default='sync', choices=['sync', 'backfill', 'daemon'],
+                        help='one-shot sync (default), backfill, or a resident daemon on the registry schedules')
+    # --rebuild recomputes and re-uploads the full history (e.g. after changing CRUSH_COST)
+    parser.add_argument('--rebuild', action='store_true', help='sync: recompute and re-upload all history')
+    # --profile writes a cProfile dump of the run (same as SYNC_PROFILE_DIR=profiles)
+    parser.add_argument('--profile', action='store_true', help='write a cProfile dump to ./profiles')
+    parser.add_argument('--start', help='backfill: first date (YYYY-MM-DD), default: earliest available')
+    parser.add_argument('--end', help='backfill: last date (YYYY-MM-DD), default: latest available')
+    parser.add_argument('--partition', default='year', choices=['year', 'quarter', 'month'],
+                        help='backfill: size of each parallel date partition')
+    parser.add_argument('--workers', type=int, help='backfill: partitions in flight (default SYNC_BACKFILL_WORKERS or 4)')
+    parser.add_argument('--no-resume', action='store_true', help='backfill: ignore checkpoints of an earlier run')
+    parser.add_argument('--shards', type=int,
+                        help='sync/daemon: worker processes for merge and compute (default SYNC_SHARDS, 0 = none)')
+    parser.add_argument('--no-initial-run', action='store_true',
+                        help='daemon: wait for the first scheduled slot instead of syncing at startup')
+    return parser.parse_args(argv)
+
+
+def log_result(result):
+    summary = result.pop('metrics', None)
+    logger.info(f"Sync result: {result}")
+    # One JSON line per run so sync.log can be grepped/parsed for stage timings
+    logger.info(f"Sync metrics: {json.dumps(summary, default=str)}")
+
+
+def run_daemon(engine, initial_run=True):
+    """Stay resident and sync each source on its registry schedule until SIGTERM/SIGINT"""
+    scheduler = Scheduler(engine, engine.registry.schedules, engine.registry.timezone,
+                          on_result=lambda sources, result: log_result(result))
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda signum, frame: scheduler.stop())
+    if initial_run:
+        scheduler.run_once(sorted(scheduler.schedules))
+    scheduler.run_forever()
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    profile_dir = 'profiles' if args.profile else None
+    engine = None
     try:
-        engine = DataEngine()
-        result = engine.sync_data()
-        logger.info(f"Sync result: {result}")
+        engine = DataEngine(shards=args.shards)
+        if args.command == 'daemon':
+            run_daemon(engine, initial_run=not args.no_initial_run)
+            return
+        if args.command == 'backfill':
+            logger.info(f"Starting backfill {args.start or 'earliest'}..{args.end or 'latest'} by {args.partition}...")
+            with profiled('backfill', profile_dir):
+                result = engine.backfill(start=args.start, end=args.end, partition=args.partition,
+                                         workers=args.workers, resume=not args.no_resume)
+        else:
+            logger.info(f"Starting scheduled data sync{' (full rebuild)' if args.rebuild else ''}...")
+            result = engine.sync_data(rebuild=args.rebuild, profile_dir=profile_dir)
+        log_result(result)
+        if args.command == 'backfill' and result.get('status') != 'success':
+            exit(1)  # non-zero so a wrapper can retry; completed partitions are checkpointed
     except Exception as e:
-        logger.error(f"Fatal error during sync: {e}")
+        logger.error(f"Fatal error during {args.command}: {e}")
         exit(1)
+    finally:
+        if engine is not None:
+            engine.close()
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
@@ -0,0 +1,133 @@
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]  # minute hour day-of-month month day-of-week
+
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        spec, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if spec == '*':
+            start, end = low, high
+        elif '-' in spec:
+            start, end = map(int, spec.split('-', 1))
+        else:
+            start = end = int(spec)
+            if step > 1:
+                end = high
+        if not (low <= start <= end <= high) or step < 1:
+            raise ValueError(f"Cron field {field!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day-of-month month day-of-week) in a timezone.
+
+    Supports `*`, lists, ranges and steps. Day-of-week is 0-7 with 0 and 7
+    both Sunday; when day-of-month and day-of-week are both restricted a day
+    matching either fires, as in cron.
+    """
+
+    def __init__(self, expr, tz='Asia/Shanghai'):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expr!r} needs 5 fields")
+        self.expr = expr
+        self.tz = ZoneInfo(tz) if isinstance(tz, str) else tz
+        self.minutes, self.hours, self.days, self.months, dows = (
+            _parse_field(f, low, high) for f, (low, high) in zip(fields, _RANGES))
+        self.dows = {d % 7 for d in dows}
+        self._any_day = fields[2] == '*'
+        self._any_dow = fields[4] == '*'
+
+    def _day_matches(self, dt):
+        dow = (dt.weekday() + 1) % 7
+        if self._any_day or self._any_dow:
+            return dt.day in self.days and dow in self.dows
+        return dt.day in self.days or dow in self.dows
+
+    def next_after(self, now):
+        """First matching minute strictly after `now` (an aware datetime), in the schedule's timezone"""
+        dt = now.astimezone(self.tz).replace(second=0, microsecond=0, tzinfo=None) + timedelta(minutes=1)
+        for _ in range(4 * 366 * 24):  # bounded: every valid expression matches within 4 years
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt.replace(tzinfo=self.tz)
+        raise ValueError(f"Cron expression {self.expr!r} never fires")
+
+
+class Scheduler:
+    """Resident sync loop: refreshes each source on its own cron schedules.
+
+    `schedules` maps a registry source name (sina, jiaoyifamen, ...) to cron
+    expressions, typically just after that market's close. When several
+    sources come due together they share one run. The engine, with its
+    connection pool, cache and resident series, lives as long as the
+    scheduler; runs skip compute/upload when the refreshed data is unchanged.
+    """
+
+    def __init__(self, engine, schedules, tz='Asia/Shanghai', on_result=None):
+        self.engine = engine
+        self.tz = ZoneInfo(tz)
+        self.schedules = {source: [CronSchedule(expr, self.tz) for expr in exprs]
+                          for source, exprs in schedules.items()}
+        unknown = set(self.schedules) - {s['source'] for s in engine.registry.series}
+        if unknown:
+            raise ValueError(f"Schedules for unknown sources: {', '.join(sorted(unknown))}")
+        self.on_result = on_result or (lambda sources, result: None)
+        self._stop = threading.Event()
+
+    def next_runs(self, now=None):
+        """{source: next fire time} after `now`"""
+        now = now or datetime.now(self.tz)
+        return {source: min(cron.next_after(now) for cron in crons)
+                for source, crons in self.schedules.items() if crons}
+
+    def run_once(self, sources):
+        """Refresh the series of `sources` (then recompute whatever depends on them)"""
+        keys = [s['key'] for s in self.engine.registry.series if s['source'] in sources]
+        logger.info(f"Scheduled refresh of {', '.join(sorted(sources))} ({', '.join(keys)})")
+        try:
+            result = self.engine.sync_data(series=keys, skip_unchanged=True)
+        except Exception as e:
+            logger.exception(f"Scheduled run for {', '.join(sorted(sources))} crashed")
+            result = {"status": "error", "message": str(e)}
+        self.on_result(sources, result)
+        return result
+
+    def run_forever(self):
+        """Sleep until the next due source(s), run, repeat; missed slots are not replayed"""
+        logger.info(f"Scheduler started: {self.describe()}")
+        while not self._stop.is_set():
+            upcoming = self.next_runs()
+            if not upcoming:
+                logger.warning("No schedules configured; scheduler exiting")
+                return
+            due_at = min(upcoming.values())
+            due = sorted(source for source, at in upcoming.items() if at == due_at)
+            logger.info(f"Next run at {due_at.isoformat()} for {', '.join(due)}")
+            if self._stop.wait(max(0.0, due_at.timestamp() - time.time())):
+                break
+            self.run_once(due)
+        logger.info("Scheduler stopped")
+
+    def stop(self):
+        self._stop.set()
+
+    def describe(self):
+        return {source: [cron.expr for cron in crons] for source, crons in self.schedules.items()}
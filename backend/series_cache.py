@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+from lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+pa = lazy_import('pyarrow')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+
+class SeriesCache:
+    """Persistent on-disk cache of fetched market series.
+
+    Every (source, symbol) pair is stored as an uncompressed Arrow IPC file,
+    which readers memory-map instead of re-parsing, plus a JSON sidecar with
+    freshness metadata (fetched_at, first/last date, row count).
+
+    Configuration:
+      DATAVIEW_CACHE_DIR  - cache directory (default backend/.cache)
+      DATAVIEW_CACHE_TTL  - seconds a cached series counts as fresh (default 3600)
+    """
+
+    def __init__(self, root=None, ttl=None):
+        self.root = root or os.environ.get("DATAVIEW_CACHE_DIR") or DEFAULT_CACHE_DIR
+        self.ttl = float(ttl if ttl is not None else os.environ.get("DATAVIEW_CACHE_TTL", 3600))
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _key(self, source, symbol):
+        return f"{source}_{symbol}".replace('/', '_')
+
+    def _lock(self, source, symbol):
+        key = self._key(source, symbol)
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def data_path(self, source, symbol):
+        return os.path.join(self.root, f"{self._key(source, symbol)}.arrow")
+
+    def meta_path(self, source, symbol):
+        return os.path.join(self.root, f"{self._key(source, symbol)}.json")
+
+    def meta(self, source, symbol):
+        try:
+            with open(self.meta_path(source, symbol)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def is_fresh(self, source, symbol, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        fetched_at = self.meta(source, symbol).get('fetched_at')
+        return bool(fetched_at) and time.time() - fetched_at < ttl and os.path.exists(self.data_path(source, symbol))
+
+    def read_table(self, source, symbol):
+        """Memory-mapped Arrow table, or None when nothing is cached"""
+        path = self.data_path(source, symbol)
+        if not os.path.exists(path):
+            return None
+        try:
+            with pa.memory_map(path, 'r') as source_file:
+                return pa.ipc.open_file(source_file).read_all()
+        except (OSError, pa.ArrowInvalid) as e:
+            logger.warning(f"Ignoring unreadable cache file {path}: {e}")
+            return None
+
+    def read(self, source, symbol):
+        table = self.read_table(source, symbol)
+        if table is None:
+            return None
+        return table.to_pandas()
+
+    def write(self, source, symbol, df, **meta):
+        """Atomically replace the cached series and its metadata"""
+        with self._lock(source, symbol):
+            self._write(source, symbol, df, meta)
+
+    def _write(self, source, symbol, df, meta):
+        path = self.data_path(source, symbol)
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(tmp, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+
+        info = {
+            'source': source,
+            'symbol': symbol,
+            'fetched_at': time.time(),
+            'rows': len(df),
+            'first_date': str(df['date'].min().date()) if len(df) and 'date' in df else None,
+            'last_date': str(df['date'].max().date()) if len(df) and 'date' in df else None,
+        }
+        info.update(meta)
+        meta_tmp = f"{self.meta_path(source, symbol)}.tmp"
+        with open(meta_tmp, 'w') as f:
+            json.dump(info, f)
+        os.replace(meta_tmp, self.meta_path(source, symbol))
+
+    def merge(self, source, symbol, df, **meta):
+        """Merge a freshly fetched frame into the cached history and persist it.
+
+        Rows from `df` win over cached rows for the same date, so upstream
+        revisions replace stale values; older cached history that has fallen
+        out of the upstream window is kept. Returns the merged frame.
+        """
+        with self._lock(source, symbol):
+            cached = self.read(source, symbol)
+            if cached is not None and not cached.empty:
+                merged = pd.concat([cached, df], ignore_index=True)
+                merged['date'] = pd.to_datetime(merged['date'])
+                merged = merged.drop_duplicates('date', keep='last').sort_values('date').reset_index(drop=True)
+            else:
+                merged = df.sort_values('date').reset_index(drop=True)
+            self._write(source, symbol, merged, meta)
+            return merged
+
+    def read_state(self, name):
+        """Small JSON state document (watermarks etc.) kept next to the series"""
+        try:
+            with open(os.path.join(self.root, f"{name}.state.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_state(self, name, state):
+        path = os.path.join(self.root, f"{name}.state.json")
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=2, default=str)
+        os.replace(tmp, path)
+
+    @contextmanager
+    def exclusive(self, name):
+        """Non-blocking advisory lock on <root>/<name>.lock shared by every process.
+
+        Yields True when acquired, False when another process holds it.
+        """
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.root, f"{name}.lock"), 'a') as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
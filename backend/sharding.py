@@ -0,0 +1,133 @@
+import os
+import logging
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ProcessPoolExecutor
+
+from lazy_imports import lazy_import
+
+pa = lazy_import('pyarrow')
+
+logger = logging.getLogger(__name__)
+
+# Where POSIX shared memory segments appear as files (Linux)
+_SHM_DIR = '/dev/shm'
+
+
+def write_shared(df):
+    """Copy `df` into a new shared memory segment as an Arrow IPC stream; returns its (name, size) ref.
+
+    The segment outlives this process's handle: whoever reads it last
+    calls release(). Only the ref crosses the process boundary, never a
+    pickled DataFrame.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    size = sink.size()
+    shm = SharedMemory(create=True, size=max(size, 1))
+    try:
+        _write_stream(shm.buf, table)
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    return shm.name, size
+
+
+def _write_stream(buf, table):
+    # Kept in its own frame so no Arrow view of the segment outlives the write
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(buf)), table.schema) as writer:
+        writer.write_table(table)
+
+
+def read_shared(ref):
+    """DataFrame from a write_shared() ref; the segment itself is left in place.
+
+    On Linux the segment is memory-mapped through Arrow, like the series
+    cache files, so columns that Arrow hands to pandas without copying
+    (strings) keep the mapping alive rather than pinning a SharedMemory
+    handle. Elsewhere the stream is copied out first.
+    """
+    name, size = ref
+    path = os.path.join(_SHM_DIR, name.lstrip('/'))
+    if os.path.exists(path):
+        with pa.memory_map(path, 'r') as source:
+            return pa.ipc.open_stream(source).read_all().to_pandas()
+    shm = SharedMemory(name=name)
+    try:
+        payload = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+    return pa.ipc.open_stream(payload).read_all().to_pandas()
+
+
+def release(refs):
+    """Unlink shared segments (ignoring ones already gone)"""
+    for name, _ in refs:
+        try:
+            segment = SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        segment.close()
+        segment.unlink()
+
+
+def assign_shards(costs, shards):
+    """Split {item: cost} into at most `shards` lists of similar total cost (largest first, greedy)"""
+    bins = [[0, []] for _ in range(max(1, min(shards, len(costs))))]
+    for item, cost in sorted(costs.items(), key=lambda kv: -kv[1]):
+        lightest = min(bins, key=lambda b: b[0])
+        lightest[0] += cost
+        lightest[1].append(item)
+    return [items for _, items in bins if items]
+
+
+class ShardPool:
+    """Worker processes for CPU-bound per-contract compute.
+
+    Tasks and results travel as small dicts of shared memory refs (see
+    write_shared); the frames themselves are Arrow IPC in /dev/shm, written
+    once and read by every worker that needs them. Workers start with
+    `start_method` (SYNC_SHARD_START_METHOD, default spawn: the engine runs
+    thread pools, which fork does not mix well with) and stay up for the
+    life of the pool, so a resident process pays their startup once.
+    """
+
+    def __init__(self, workers, start_method=None):
+        self.workers = workers
+        self.start_method = start_method or os.environ.get("SYNC_SHARD_START_METHOD", "spawn")
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            context = multiprocessing.get_context(self.start_method)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+    def map(self, fn, tasks):
+        """fn(task) for every task in the workers; results in task order.
+
+        Each result must be a {name: ref} dict; if any task fails, the
+        segments of the ones that succeeded are released before re-raising.
+        """
+        futures = [self.executor.submit(fn, task) for task in tasks]
+        results, error = [], None
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            for refs in results:
+                release(refs.values())
+            raise error
+        return results
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
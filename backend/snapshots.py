@@ -0,0 +1,191 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+
+from lazy_imports import lazy_import
+from series_cache import DEFAULT_CACHE_DIR
+
+np = lazy_import('numpy')
+pa = lazy_import('pyarrow')
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _compact_table(df):
+    """Arrow table for the compact file: date32 dates, float32 numbers, other columns as they are"""
+    arrays, names = [], []
+    for col in df.columns:
+        values = df[col]
+        if col == 'date':
+            array = pa.array(values.to_numpy(dtype='datetime64[D]'), pa.date32())
+        elif values.dtype.kind in 'fiu':
+            array = pa.array(values.to_numpy(dtype='float32'), pa.float32(), from_pandas=True)
+        else:
+            array = pa.array(values.to_numpy(), from_pandas=True)
+        arrays.append(array)
+        names.append(col)
+    return pa.table(arrays, names=names)
+
+
+def _years(df):
+    """(year, start row, end row) of each calendar year in a date-sorted frame"""
+    years = df['date'].dt.year.to_numpy()
+    bounds = np.flatnonzero(np.diff(years)) + 1
+    starts, ends = np.concatenate([[0], bounds]), np.concatenate([bounds, [len(years)]])
+    return [(int(years[s]), int(s), int(e)) for s, e in zip(starts, ends)]
+
+
+class SnapshotStore:
+    """Versioned binary snapshots of computed outputs, for readers that want the whole series.
+
+    Each version of a dataset is a directory <root>/<dataset>/<version>/ with
+      <dataset>.parquet      full precision, one row group per year
+      <dataset>.f32.arrow    Arrow IPC file, float32 values and date32 dates,
+                             one record batch per year (memory-mappable)
+      manifest.json          rows, date range, columns, file sizes and sha256,
+                             and the byte range of the Arrow schema and of each
+                             year's batch, so a client can Range-request a window
+    <root>/<dataset>/manifest.json is a copy of the latest version's manifest.
+    Versions are immutable; the newest `keep` are retained so a reader
+    mid-download of the previous one can finish.
+
+    Configuration:
+      DATAVIEW_SNAPSHOT_DIR   - snapshot directory (default <cache dir>/snapshots)
+      DATAVIEW_SNAPSHOT_KEEP  - versions kept per dataset (default 3)
+    """
+
+    def __init__(self, root=None, keep=None):
+        cache_root = os.environ.get("DATAVIEW_CACHE_DIR") or DEFAULT_CACHE_DIR
+        self.root = root or os.environ.get("DATAVIEW_SNAPSHOT_DIR") or os.path.join(cache_root, 'snapshots')
+        self.keep = max(1, int(keep or os.environ.get("DATAVIEW_SNAPSHOT_KEEP", 3)))
+
+    def datasets(self):
+        try:
+            names = sorted(os.listdir(self.root))
+        except OSError:
+            return []
+        return [name for name in names if os.path.exists(os.path.join(self.root, name, MANIFEST))]
+
+    def _valid(self, dataset):
+        return bool(dataset) and not dataset.startswith('.') and os.path.basename(dataset) == dataset
+
+    def latest(self, dataset):
+        """Manifest of the newest version, or None"""
+        if not self._valid(dataset):
+            return None
+        try:
+            with open(os.path.join(self.root, dataset, MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def file_path(self, dataset, version, filename):
+        """Path of a file listed in that version's manifest, or None (unknown dataset/version/file)"""
+        if not self._valid(dataset):
+            return None
+        try:
+            with open(os.path.join(self.root, dataset, str(int(version)), MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not any(entry['path'] == filename for entry in manifest['files'].values()):
+            return None
+        return os.path.join(self.root, dataset, str(int(version)), filename)
+
+    def write(self, dataset, df, digest=None):
+        """Write `df` (a date column plus values) as the dataset's next version; returns its manifest"""
+        df = df.drop_duplicates('date', keep='last').sort_values('date').reset_index(drop=True)
+        previous = self.latest(dataset)
+        version = (previous['version'] + 1) if previous else 1
+        base = os.path.join(self.root, dataset)
+        directory = os.path.join(base, str(version))
+        tmp = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            years = _years(df) if len(df) else []
+            parquet = self._write_parquet(os.path.join(tmp, f"{dataset}.parquet"), df, years)
+            arrow = self._write_compact(os.path.join(tmp, f"{dataset}.f32.arrow"), df, years)
+            manifest = {
+                'dataset': dataset,
+                'version': version,
+                'created_at': datetime.now().isoformat(),
+                'digest': digest,
+                'rows': len(df),
+                'first_date': str(df['date'].iloc[0].date()) if len(df) else None,
+                'last_date': str(df['date'].iloc[-1].date()) if len(df) else None,
+                'columns': [{'name': col, 'dtype': str(df[col].dtype)} for col in df.columns],
+                'files': {'parquet': parquet, 'arrow': arrow},
+            }
+            with open(os.path.join(tmp, MANIFEST), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp, directory)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        latest_tmp = os.path.join(base, f"{MANIFEST}.tmp")
+        with open(latest_tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(latest_tmp, os.path.join(base, MANIFEST))
+        self._prune(base, version)
+        logger.info(f"Snapshot {dataset} v{version}: {len(df)} rows, "
+                    f"{parquet['bytes']} B parquet, {arrow['bytes']} B arrow")
+        return manifest
+
+    def _write_parquet(self, path, df, years):
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(path, table.schema, compression='zstd') as writer:
+            for _, start, end in years or [(None, 0, 0)]:
+                writer.write_table(table.slice(start, end - start))
+        return {'path': os.path.basename(path), 'bytes': os.path.getsize(path), 'sha256': _sha256(path),
+                'format': 'parquet', 'row_groups': 'year'}
+
+    def _write_compact(self, path, df, years):
+        """Arrow IPC file with one batch per year; records each batch's byte range.
+
+        The schema message starts at byte 8 (after the file magic). A client
+        can concatenate it with any batches' bytes and read the result as an
+        Arrow IPC stream, without downloading the rest of the file.
+        """
+        table = _compact_table(df)
+        schema_bytes = table.schema.serialize().size
+        batches, offset = [], 8 + schema_bytes
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                for year, start, end in years:
+                    for batch in table.slice(start, end - start).combine_chunks().to_batches():
+                        writer.write_batch(batch)
+                    batches.append({
+                        'year': year,
+                        'first_date': str(df['date'].iloc[start].date()),
+                        'last_date': str(df['date'].iloc[end - 1].date()),
+                        'rows': end - start,
+                        'offset': offset,
+                        'length': sink.tell() - offset,
+                    })
+                    offset = sink.tell()
+        return {'path': os.path.basename(path), 'bytes': os.path.getsize(path), 'sha256': _sha256(path),
+                'format': 'arrow', 'schema': {'offset': 8, 'length': schema_bytes},
+                'columns': [{'name': field.name, 'type': str(field.type)} for field in table.schema],
+                'batches': batches}
+
+    def _prune(self, base, version):
+        for name in os.listdir(base):
+            if name.isdigit() and int(name) <= version - self.keep:
+                shutil.rmtree(os.path.join(base, name), ignore_errors=True)
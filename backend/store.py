@@ -0,0 +1,182 @@
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+logger = logging.getLogger(__name__)
+
+
+class _Dataset:
+    """Date-sorted column arrays for one series; slices are found with searchsorted"""
+
+    def __init__(self, df):
+        df = df.drop_duplicates('date', keep='last').sort_values('date')
+        self.dates = df['date'].to_numpy(dtype='datetime64[D]')
+        self.date_strings = np.datetime_as_string(self.dates, unit='D')
+        self.columns = {}
+        for col in df.columns:
+            if col == 'date':
+                continue
+            values = df[col].to_numpy()
+            if values.dtype.kind in 'fiu':
+                values = values.astype('float64')
+            self.columns[col] = values
+
+    def frame(self):
+        df = pd.DataFrame(self.columns)
+        df.insert(0, 'date', self.dates)
+        return df
+
+    def bounds(self, start=None, end=None):
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, 'D'), 'left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, 'D'), 'right'))
+        return lo, max(lo, hi)
+
+
+def _jsonable(values):
+    if values.dtype.kind == 'f' and np.isnan(values).any():
+        return np.where(np.isnan(values), None, values).tolist()
+    return values.tolist()
+
+
+class SeriesStore:
+    """In-memory, date-indexed store behind the backend read API.
+
+    Holds every registered spread (crush_margins, ...), the rolling
+    statistics of each analytics metric (crush_margin_stats.gross_margin, ...)
+    and raw series (Y, M, B0, ...). It loads once from the local series cache, falling back to
+    Supabase for crush_margins, and is updated in place from DataEngine after
+    each sync. Encoded responses are memoized per (dataset, range, format,
+    version) so repeated chart reads skip slicing and JSON encoding.
+    """
+
+    def __init__(self, response_cache_size=256):
+        self._datasets = {}
+        self._versions = {}
+        self._lock = threading.RLock()
+        self._responses = OrderedDict()
+        self._response_cache_size = response_cache_size
+        self.loaded = False
+
+    def load(self, engine):
+        """Populate from the engine's local cache, or Supabase when the cache is empty"""
+        with self._lock:
+            if self.loaded:
+                return
+            cache = engine.cache
+            if cache:
+                for output in engine.registry.outputs:
+                    if output['kind'] == 'spread':
+                        names = [output['name']]
+                    elif output['kind'] == 'analytics':
+                        names = [f"{output['name']}.{metric}" for metric in output['columns']]
+                    else:
+                        continue
+                    for name in names:
+                        df = cache.read('derived', name)
+                        if df is not None and not df.empty:
+                            self.update(name, df)
+                for series in engine.registry.series:
+                    df = cache.read(series['source'], series['symbol'])
+                    if df is not None and not df.empty:
+                        self.update(series['key'], df)
+
+            if 'crush_margins' not in self._datasets:
+                df = self._load_from_supabase(engine, 'crush_margins')
+                if df is not None and not df.empty:
+                    self.update('crush_margins', df)
+            self.loaded = True
+            logger.info(f"Read store loaded: {', '.join(f'{k}={len(v.dates)}' for k, v in self._datasets.items())}")
+
+    def _load_from_supabase(self, engine, table, page_size=1000):
+        rows, offset = [], 0
+        while True:
+            page = engine._supabase_rest_request('GET', f'/rest/v1/{table}', params={
+                "select": "*", "order": "date.asc", "limit": str(page_size), "offset": str(offset),
+            })
+            if not isinstance(page, list) or not page:
+                break
+            rows.extend(page)
+            if len(page) < page_size:
+                break
+            offset += page_size
+        if not rows:
+            return None
+        df = pd.DataFrame(rows).drop(columns=['updated_at'], errors='ignore')
+        df['date'] = pd.to_datetime(df['date'])
+        for col in df.columns.drop('date'):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        return df
+
+    def update(self, name, df):
+        """Merge new rows into a dataset in place (same date replaces the old row)"""
+        if df is None or df.empty:
+            return
+        df = df.copy()
+        df['date'] = pd.to_datetime(df['date'])
+        with self._lock:
+            current = self._datasets.get(name)
+            if current is not None:
+                df = pd.concat([current.frame(), df], ignore_index=True)
+            self._datasets[name] = _Dataset(df)
+            self._versions[name] = self._versions.get(name, 0) + 1
+            for key in [k for k in self._responses if k[0] == name]:
+                del self._responses[key]
+
+    def datasets(self):
+        with self._lock:
+            return {
+                name: {
+                    "rows": len(ds.dates),
+                    "start": str(ds.dates[0]) if len(ds.dates) else None,
+                    "end": str(ds.dates[-1]) if len(ds.dates) else None,
+                    "columns": list(ds.columns),
+                    "version": self._versions[name],
+                }
+                for name, ds in self._datasets.items()
+            }
+
+    def version(self, name):
+        return self._versions.get(name)
+
+    def render(self, name, start=None, end=None, fmt='columnar'):
+        """Encoded response for a date range: (body bytes, gzip bytes or None, etag), or None"""
+        with self._lock:
+            ds = self._datasets.get(name)
+            if ds is None:
+                return None
+            key = (name, start, end, fmt, self._versions[name])
+            cached = self._responses.get(key)
+            if cached is not None:
+                self._responses.move_to_end(key)
+                return cached
+
+            lo, hi = ds.bounds(start, end)
+            dates = ds.date_strings[lo:hi].tolist()
+            if fmt == 'records':
+                columns = {col: _jsonable(values[lo:hi]) for col, values in ds.columns.items()}
+                payload = [dict(zip(['date', *columns], row)) for row in zip(dates, *columns.values())]
+            else:
+                payload = {
+                    "dataset": name,
+                    "version": self._versions[name],
+                    "rows": hi - lo,
+                    "columns": ['date', *ds.columns],
+                    "data": {"date": dates, **{col: _jsonable(v[lo:hi]) for col, v in ds.columns.items()}},
+                }
+            body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            compressed = gzip.compress(body, compresslevel=5) if len(body) > 1024 else None
+            etag = hashlib.sha1(body).hexdigest()[:20]
+
+            cached = (body, compressed, etag)
+            self._responses[key] = cached
+            if len(self._responses) > self._response_cache_size:
+                self._responses.popitem(last=False)
+            return cached
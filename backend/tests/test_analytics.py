@@ -0,0 +1,121 @@
+import json
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import RollingStats, _SortedValues, rolling_stats, stat_columns
+
+
+@pytest.fixture(scope='module')
+def history():
+    """~2,700 business days over 2014-2024 with random gaps (holidays)"""
+    rng = np.random.default_rng(1)
+    dates = pd.bdate_range('2014-01-01', '2024-12-31')
+    dates = dates[rng.random(len(dates)) > 0.05]
+    values = rng.normal(300, 80, len(dates)).cumsum() / 50 + rng.normal(0, 5, len(dates))
+    return dates, values
+
+
+@pytest.fixture(scope='module')
+def batch(history):
+    return rolling_stats(*history)
+
+
+def position(dates, day):
+    return int(dates.searchsorted(pd.Timestamp(day)))
+
+
+def assert_same_stats(incremental, expected):
+    expected = expected.reset_index(drop=True)
+    assert list(incremental.columns) == list(expected.columns)
+    assert (incremental['date'].to_numpy() == expected['date'].to_numpy()).all()
+    for col in stat_columns():
+        # Exact: both paths round the same way, so digests of their outputs match
+        np.testing.assert_array_equal(incremental[col].to_numpy(), expected[col].to_numpy(), err_msg=col)
+
+
+@pytest.mark.parametrize('split', [0, 1, 19, 20, 250, 251, 'leap', 'month', 'year', -1])
+def test_incremental_matches_batch(history, batch, split):
+    dates, values = history
+    split = {'leap': position(dates, '2020-02-28') + 1,      # history ends on Feb 28 of a leap year
+             'month': position(dates, '2019-07-01'),
+             'year': position(dates, '2022-01-01'),
+             -1: len(dates) - 1}.get(split, split)
+    stats = RollingStats.from_history(dates[:split], values[:split])
+    assert_same_stats(stats.extend(dates[split:], values[split:]), batch.iloc[split:])
+
+
+def test_extend_in_several_steps(history, batch):
+    dates, values = history
+    stats = RollingStats.from_history(dates[:2000], values[:2000])
+    bounds = [2000, 2001, 2050, 2300, len(dates)]
+    parts = [stats.extend(dates[a:b], values[a:b]) for a, b in zip(bounds, bounds[1:])]
+    assert_same_stats(pd.concat(parts, ignore_index=True), batch.iloc[2000:])
+
+
+def test_feb_29_compares_with_feb_28():
+    dates = pd.DatetimeIndex(['2019-02-27', '2019-02-28', '2019-03-01',
+                              '2020-02-27', '2020-02-28', '2020-02-29', '2020-03-02',
+                              '2021-02-26', '2021-03-01'])
+    values = np.arange(1.0, 10.0)
+    expected = rolling_stats(dates, values, windows=(2,)).set_index('date')
+    assert expected.loc['2020-02-28', 'last_year'] == 2.0
+    assert expected.loc['2020-02-29', 'last_year'] == 2.0
+    # Mar 1 2020 is a Sunday: the value carried forward from Saturday Feb 29
+    assert expected.loc['2021-03-01', 'last_year'] == 6.0
+    assert expected.loc['2021-03-01', 'doy_avg'] == pytest.approx((3.0 + 6.0) / 2)
+    for split in range(len(dates)):
+        stats = RollingStats.from_history(dates[:split], values[:split], windows=(2,))
+        incremental = stats.extend(dates[split:], values[split:]).set_index('date')
+        pd.testing.assert_frame_equal(incremental, expected.iloc[split:])
+
+
+def test_flat_window_has_no_z_score():
+    dates = pd.bdate_range('2024-01-01', periods=30)
+    values = np.full(30, 5.0)
+    for frame in (rolling_stats(dates, values), RollingStats().extend(dates, values)):
+        assert frame['z_20'].isna().all()
+        assert (frame['mean_20'].dropna() == 5.0).all()
+        assert (frame['pct'] == 100.0).all()
+
+
+def test_empty_history():
+    assert list(rolling_stats([], []).columns) == ['date'] + stat_columns()
+    assert len(RollingStats.from_history([], []).extend([], [])) == 0
+
+
+def test_sorted_values_counts_like_a_sorted_list():
+    rng = random.Random(0)
+    values, reference = _SortedValues(bucket=4), []
+    copies = []
+    for i in range(600):
+        value = float(rng.randrange(50))
+        values.insert(value)
+        reference.append(value)
+        if i % 97 == 0:
+            copies.append((values.copy(), sorted(reference)))
+        probe = rng.uniform(-1, 51)
+        assert values.count_le(probe) == int(np.searchsorted(np.sort(reference), probe, side='right'))
+    np.testing.assert_array_equal(values.values(), np.sort(reference))
+    # Copies are unaffected by later inserts into the original (and the other way round)
+    for copy, expected in copies:
+        np.testing.assert_array_equal(copy.values(), expected)
+        copy.insert(-1.0)
+        assert copy.count_le(-1.0) == 1
+    assert values.count_le(-1.0) == 0
+
+
+def test_copy_and_state_resume_like_from_history(history, batch):
+    dates, values = history
+    stats = RollingStats.from_history(dates[:1000], values[:1000])
+    stats.extend(dates[1000:1500], values[1000:1500])
+    copy = stats.copy()
+    state, sorted_values = stats.state()
+    restored = RollingStats.from_state(json.loads(json.dumps(state)), sorted_values)
+    stats.extend(dates[1500:1600], values[1500:1600])  # must not leak into the copy
+
+    expected = batch.iloc[1500:]
+    assert_same_stats(copy.extend(dates[1500:], values[1500:]), expected)
+    assert_same_stats(restored.extend(dates[1500:], values[1500:]), expected)
@@ -0,0 +1,20 @@
+import subprocess
+
+import pytest
+
+from data_engine import HttpClient
+
+
+@pytest.mark.parametrize('timeout, max_time', [(0.2, '1'), (1, '1'), (2.5, '3'), (30, '30')])
+def test_curl_max_time_never_rounds_down_to_no_limit(monkeypatch, timeout, max_time):
+    calls = []
+
+    def run(cmd, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0, stdout=b'{}\n200')
+
+    monkeypatch.setattr(subprocess, 'run', run)
+    response = HttpClient(mode='curl').get('http://127.0.0.1:1/x', timeout=timeout)
+    assert response.status == 200
+    cmd = calls[0]
+    assert cmd[cmd.index('--max-time') + 1] == max_time
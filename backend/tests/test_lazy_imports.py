@@ -0,0 +1,60 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from benchmarks import HEAVY_MODULES, STARTUP_TARGETS, bench_startup
+from lazy_imports import lazy_import
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 400))
+
+# Eight threads make the first access to a lazily imported module at the same moment
+RACE = """
+import sys, threading
+from lazy_imports import lazy_import
+assert 'pyarrow' not in sys.modules
+pa = lazy_import('pyarrow')
+errors, barrier = [], threading.Barrier(8)
+def touch():
+    barrier.wait()
+    try:
+        pa.memory_map
+    except Exception as e:
+        errors.append(repr(e))
+threads = [threading.Thread(target=touch) for _ in range(8)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+print(len(errors), errors[:1])
+"""
+
+
+def test_concurrent_first_access_sees_the_whole_module():
+    for _ in range(3):
+        proc = subprocess.run([sys.executable, '-c', RACE], cwd=BACKEND, capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
+        assert proc.stdout.split()[0] == '0', proc.stdout
+
+
+def test_import_is_deferred_until_first_use():
+    proc = subprocess.run([sys.executable, '-c', (
+        "import sys; from lazy_imports import lazy_import; m = lazy_import('csv'); "
+        "print('csv' in sys.modules); m.reader; print('csv' in sys.modules)")],
+        cwd=BACKEND, capture_output=True, text=True)
+    assert proc.stdout.split() == ['False', 'True'], proc.stderr
+
+
+def test_missing_module_fails_up_front():
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import('dataview_no_such_module')
+
+
+@pytest.mark.parametrize('target', STARTUP_TARGETS)
+def test_entry_point_import_stays_within_budget(target):
+    # Best of 3 cold interpreters under -X importtime, as `benchmarks.py startup` measures it
+    result, = bench_startup([target], runs=3, budget_ms=STARTUP_BUDGET_MS)
+    assert result['heavy_loaded'] is None, f"import {target} loads {result['heavy_loaded']} ({HEAVY_MODULES} must stay lazy)"
+    assert result['import_ms'] <= STARTUP_BUDGET_MS, f"import {target} took {result['import_ms']}ms"
@@ -0,0 +1,103 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from bench_stub import jiaoyifamen_payload, sina_payload
+from benchmarks import legacy_parse_jiaoyifamen, legacy_parse_sina, new_parse_jiaoyifamen, new_parse_sina
+from parsers import SinaKlineParser, parse_jiaoyifamen, parse_jiaoyifamen_dates, to_frame
+
+
+def days(*labels):
+    return np.array(labels, dtype='datetime64[D]').astype(np.int64)
+
+
+def assert_same_frame(new, legacy):
+    legacy = legacy.reset_index(drop=True)
+    assert list(new.columns) == list(legacy.columns)
+    assert (new['date'].to_numpy() == legacy['date'].to_numpy()).all()
+    for col in new.columns[1:]:
+        np.testing.assert_array_equal(new[col].to_numpy(np.float64), legacy[col].to_numpy(np.float64))
+
+
+@pytest.mark.parametrize('n', [1, 250, 3000])
+def test_sina_matches_legacy(n):
+    payload = sina_payload(n)
+    assert_same_frame(new_parse_sina(payload), legacy_parse_sina(payload.decode('utf-8')))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 4096])
+def test_sina_chunk_boundaries_do_not_matter(chunk_size):
+    payload = sina_payload(300)
+    expected = new_parse_sina(payload, chunk_size=len(payload))
+    assert_same_frame(new_parse_sina(payload, chunk_size=chunk_size), expected)
+
+
+def test_sina_row_missing_a_field_is_rejected():
+    parser = SinaKlineParser()
+    with pytest.raises(ValueError):
+        parser.feed('var _B0=([{"d":"2024-01-02","o":"1"},{"d":"2024-01-03","c":"2"}]);')
+
+
+@pytest.mark.parametrize('short_dates', [False, True])
+def test_jiaoyifamen_matches_legacy(short_dates):
+    # The legacy parser infers MM-DD years from the real clock, so the new one does too here
+    payload = jiaoyifamen_payload(300, short_dates=short_dates)
+    assert_same_frame(new_parse_jiaoyifamen(payload), legacy_parse_jiaoyifamen(payload.decode('utf-8')))
+
+
+def test_jiaoyifamen_drops_unparseable_rows_like_legacy():
+    payload = json.dumps({'data': {
+        'category': ['2024-01-02', 'not a date', '2024-01-04', '2024-01-05'],
+        'futuresPrice': [8000, 8100, 'nan', 8300],
+        'basisValue': [200, 210, 220, 230],
+    }})
+    new = new_parse_jiaoyifamen(payload)
+    assert_same_frame(new, legacy_parse_jiaoyifamen(payload))
+    assert new['date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-02', '2024-01-05']
+
+
+def test_mmdd_year_inference():
+    today = datetime(2024, 3, 15)
+    labels = ['01-31', '03-15', '03-31', '04-01', '12-31']
+    np.testing.assert_array_equal(parse_jiaoyifamen_dates(labels, today),
+                                  days('2024-01-31', '2024-03-15', '2024-03-31', '2023-04-01', '2023-12-31'))
+
+
+def test_mmdd_in_january_puts_december_in_last_year():
+    today = datetime(2025, 1, 2)
+    np.testing.assert_array_equal(parse_jiaoyifamen_dates(['12-30', '12-31', '01-02'], today),
+                                  days('2024-12-30', '2024-12-31', '2025-01-02'))
+
+
+def test_mmdd_feb_29_only_exists_in_leap_years():
+    nat = np.iinfo(np.int64).min
+    leap = parse_jiaoyifamen_dates(['02-28', '02-29', '03-01'], datetime(2024, 6, 1))
+    np.testing.assert_array_equal(leap, days('2024-02-28', '2024-02-29', '2024-03-01'))
+    # Feb 29 2025 does not exist; pd.to_datetime(errors='coerce') in the legacy parser gave NaT
+    plain = parse_jiaoyifamen_dates(['02-28', '02-29', '03-01'], datetime(2025, 6, 1))
+    np.testing.assert_array_equal(plain, [days('2025-02-28')[0], nat, days('2025-03-01')[0]])
+
+
+def test_mmdd_rejects_impossible_dates():
+    nat = np.iinfo(np.int64).min
+    result = parse_jiaoyifamen_dates(['00-10', '13-01', '04-31', '04-00'], datetime(2024, 12, 31))
+    assert (result == nat).all()
+
+
+def test_mixed_labels_are_sorted_by_date():
+    payload = {'data': {
+        'category': ['2023-12-29', '01-03', '01-02'],
+        'futuresPrice': [1, 3, 2],
+        'basisValue': [10, 30, 20],
+    }}
+    dates, price, basis = parse_jiaoyifamen(payload, today=datetime(2024, 1, 5))
+    frame = to_frame(dates, price=price, basis=basis)
+    assert frame['date'].dt.strftime('%Y-%m-%d').tolist() == ['2023-12-29', '2024-01-02', '2024-01-03']
+    assert frame['price'].tolist() == [1, 2, 3]
+
+
+def test_payload_without_the_expected_keys():
+    assert parse_jiaoyifamen({'data': {'category': [], 'futuresPrice': []}}) is None
+    assert parse_jiaoyifamen({'code': 1}) is None
@@ -0,0 +1,43 @@
+import gzip
+import json
+
+import pytest
+
+import app as app_module
+from benchmarks import synthetic_margins
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = app_module.SeriesStore()
+    store.update('crush_margins', synthetic_margins(300))
+    store.loaded = True
+    monkeypatch.setattr(app_module, 'store', store)
+    return app_module.app.test_client()
+
+
+def test_gzip_and_identity_have_different_etags(client):
+    plain = client.get('/api/series/crush_margins')
+    zipped = client.get('/api/series/crush_margins', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == zipped.headers['Vary'] == 'Accept-Encoding'
+    assert plain.headers['ETag'] != zipped.headers['ETag']
+    assert json.loads(gzip.decompress(zipped.data)) == json.loads(plain.data)
+
+
+def test_if_none_match_only_matches_the_same_representation(client):
+    plain = client.get('/api/series/crush_margins')
+    zipped = client.get('/api/series/crush_margins', headers={'Accept-Encoding': 'gzip'})
+
+    assert client.get('/api/series/crush_margins', headers={'If-None-Match': plain.headers['ETag']}).status_code == 304
+    revalidated = client.get('/api/series/crush_margins',
+                             headers={'Accept-Encoding': 'gzip', 'If-None-Match': zipped.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == zipped.headers['ETag']
+
+    # A cached gzip body must not validate a request for the identity body, and vice versa
+    assert client.get('/api/series/crush_margins', headers={'If-None-Match': zipped.headers['ETag']}).data == plain.data
+    crossed = client.get('/api/series/crush_margins',
+                         headers={'Accept-Encoding': 'gzip', 'If-None-Match': plain.headers['ETag']})
+    assert crossed.status_code == 200 and crossed.headers['Content-Encoding'] == 'gzip'
@@ -0,0 +1,94 @@
+import random
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from scheduler import CronSchedule
+
+TZ = ZoneInfo('Asia/Shanghai')
+
+
+def at(*args):
+    return datetime(*args, tzinfo=TZ)
+
+
+def brute_force_next(cron, now):
+    """Reference: walk minute by minute (a day at a time through days that cannot match)"""
+    dt = now.astimezone(cron.tz).replace(second=0, microsecond=0) + timedelta(minutes=1)
+    while True:
+        if dt.month not in cron.months or not cron._day_matches(dt):
+            dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+        elif dt.minute in cron.minutes and dt.hour in cron.hours:
+            return dt
+        else:
+            dt += timedelta(minutes=1)
+
+
+def test_weekday_schedule_skips_the_weekend():
+    cron = CronSchedule('30 15 * * 1-5')
+    # Friday 2024-06-07 after the slot -> Monday 2024-06-10
+    assert cron.next_after(at(2024, 6, 7, 15, 30)) == at(2024, 6, 10, 15, 30)
+    assert cron.next_after(at(2024, 6, 8, 9, 0)) == at(2024, 6, 10, 15, 30)
+    assert cron.next_after(at(2024, 6, 10, 15, 29, 59)) == at(2024, 6, 10, 15, 30)
+
+
+def test_sunday_is_both_0_and_7():
+    assert CronSchedule('0 9 * * 0').next_after(at(2024, 6, 7)) == at(2024, 6, 9, 9, 0)
+    assert CronSchedule('0 9 * * 7').next_after(at(2024, 6, 7)) == at(2024, 6, 9, 9, 0)
+
+
+def test_feb_29_waits_for_the_next_leap_year():
+    cron = CronSchedule('0 0 29 2 *')
+    assert cron.next_after(at(2024, 2, 28, 12, 0)) == at(2024, 2, 29, 0, 0)
+    assert cron.next_after(at(2024, 2, 29, 0, 0)) == at(2028, 2, 29, 0, 0)
+
+
+def test_month_end_rolls_over_short_months():
+    cron = CronSchedule('0 18 31 * *')
+    assert cron.next_after(at(2024, 4, 1)) == at(2024, 5, 31, 18, 0)
+    assert cron.next_after(at(2024, 12, 31, 18, 0)) == at(2025, 1, 31, 18, 0)
+
+
+def test_steps():
+    cron = CronSchedule('*/15 9-10 * * *')
+    assert cron.next_after(at(2024, 6, 7, 9, 0)) == at(2024, 6, 7, 9, 15)
+    assert cron.next_after(at(2024, 6, 7, 10, 45)) == at(2024, 6, 8, 9, 0)
+    assert CronSchedule('5/20 * * * *').minutes == {5, 25, 45}
+    assert CronSchedule('0 1-11/5 * * *').hours == {1, 6, 11}
+
+
+def test_day_of_month_or_day_of_week():
+    # Both restricted: the 1st of the month or any Monday
+    cron = CronSchedule('0 8 1 * 1')
+    assert cron.next_after(at(2024, 6, 1, 9, 0)) == at(2024, 6, 3, 8, 0)
+    assert cron.next_after(at(2024, 6, 24, 9, 0)) == at(2024, 7, 1, 8, 0)
+
+
+def test_result_is_in_the_schedule_timezone():
+    cron = CronSchedule('0 15 * * *')
+    now = datetime(2024, 6, 7, 6, 0, tzinfo=ZoneInfo('UTC'))  # 14:00 in Shanghai
+    assert cron.next_after(now) == at(2024, 6, 7, 15, 0)
+    assert cron.next_after(now).tzinfo == TZ
+
+
+@pytest.mark.parametrize('expr', ['30 15 * * 1-5', '*/15 9-10 * * *', '0 0 29 2 *', '0 8 1,15 * 1',
+                                  '45 23 31 1,3,12 *', '0 0 * 2 6,0'])
+def test_matches_a_brute_force_search(expr):
+    cron = CronSchedule(expr)
+    rng = random.Random(expr)
+    for _ in range(20):
+        now = at(2023, 1, 1) + timedelta(minutes=rng.randrange(3 * 366 * 24 * 60), seconds=rng.randrange(60))
+        assert cron.next_after(now) == brute_force_next(cron, now)
+
+
+@pytest.mark.parametrize('expr', ['* * * *', '60 * * * *', '0 24 * * *', '0 0 0 * *', '0 0 * 13 *',
+                                  '0 0 * * 8', '*/0 * * * *', '5-1 * * * *'])
+def test_invalid_expressions(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr)
+
+
+def test_expression_that_never_fires():
+    with pytest.raises(ValueError):
+        CronSchedule('0 0 31 2 *').next_after(at(2024, 1, 1))
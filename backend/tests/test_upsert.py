@@ -0,0 +1,59 @@
+import math
+import threading
+
+import pytest
+
+from bench_stub import StubServer
+from benchmarks import synthetic_margins
+from data_engine import CRUSH_MARGIN_COLUMNS, DataEngine, serialize_records
+from metrics import Metrics
+
+MAX_BODY = 200_000
+
+
+@pytest.fixture
+def stub():
+    server = StubServer(max_body=MAX_BODY)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def upsert(stub, records, max_batch_bytes):
+    metrics = Metrics()
+    engine = DataEngine(supabase_url=stub.url, supabase_key='test', cache=False, metrics=metrics)
+    stats = engine.upsert_records('crush_margins', records, max_batch_bytes=max_batch_bytes)
+    return stats, metrics.value('dataview_upload_batches_total', table='crush_margins', status=413)
+
+
+def test_413_shrinks_the_budget_once_per_rejection(stub):
+    records = serialize_records(synthetic_margins(20_000), CRUSH_MARGIN_COLUMNS)
+    total = sum(len(r) + 1 for r in records)
+
+    stats, rejected = upsert(stub, records, 4 * 1024 * 1024)
+
+    # 4 MiB -> 2 MiB -> ... -> 128 KiB: one 413 per halving until a body fits
+    assert rejected <= math.ceil(math.log2(4 * 1024 * 1024 / MAX_BODY))
+    # after that every body is packed up to the accepted budget, not split further
+    assert stats['batches'] <= math.ceil(total / (MAX_BODY // 2)) + 1
+    assert stats['rows'] == len(records)
+    assert stub.stats['crush_margins']['rows'] == len(records)
+    assert stub.stats['crush_margins']['requests'] == stats['batches']
+
+
+def test_budget_that_fits_sends_no_rejected_requests(stub):
+    records = serialize_records(synthetic_margins(20_000), CRUSH_MARGIN_COLUMNS)
+    total = sum(len(r) + 1 for r in records)
+
+    stats, rejected = upsert(stub, records, 190_000)
+
+    assert rejected == 0
+    assert stats['batches'] <= math.ceil(total / 190_000) + 1
+    assert stub.stats['crush_margins']['rows'] == len(records)
+
+
+def test_single_row_over_the_limit_fails(stub):
+    with pytest.raises(RuntimeError, match='413'):
+        upsert(stub, [b'{"pad":"' + b'x' * MAX_BODY + b'"}'], 4 * 1024 * 1024)
@@ -31,22 +31,75 @@ CREATE TABLE IF NOT EXISTS position_data (
     UNIQUE(contract, trade_date)
 );
 
+-- 价差数据历史（棕榈油-豆油、菜油-豆油等，由 backend/sync_registry.json 定义）
+CREATE TABLE IF NOT EXISTS spread_data (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL,        -- palm_soy_oil, rapeseed_soy_oil 等
+    trade_date DATE NOT NULL,
+    value DECIMAL(12,4) NOT NULL,
+    is_stale BOOLEAN NOT NULL DEFAULT FALSE,  -- 由缓存的旧数据（last-known-good）计算得出
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE(name, trade_date)
+);
+ALTER TABLE spread_data ADD COLUMN IF NOT EXISTS is_stale BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- 压榨利润滚动统计（由 backend/analytics.py 在同步时预先计算，窗口见 sync_registry.json）
+CREATE TABLE IF NOT EXISTS margin_stats (
+    id SERIAL PRIMARY KEY,
+    metric VARCHAR(50) NOT NULL,      -- gross_margin, futures_margin, oil_meal_ratio
+    trade_date DATE NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    mean_20 DOUBLE PRECISION,         -- 20/60/250 日滚动均值
+    z_20 DOUBLE PRECISION,            -- 相对滚动均值的 z-score
+    mean_60 DOUBLE PRECISION,
+    z_60 DOUBLE PRECISION,
+    mean_250 DOUBLE PRECISION,
+    z_250 DOUBLE PRECISION,
+    pct DOUBLE PRECISION,             -- 历史百分位（0-100，截至当日）
+    last_year DOUBLE PRECISION,       -- 去年同日（或之前最近交易日）的值
+    doy_avg DOUBLE PRECISION,         -- 往年同日均值
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE(metric, trade_date)
+);
+
+-- 同步内容摘要（变更检测）：每个源序列、每个输出按日期分区（默认按月）的哈希，
+-- period = '*' 为整体摘要（输出为其定义的摘要）。由 backend/data_engine.py 维护，
+-- 只重算/上传摘要变化的分区。
+CREATE TABLE IF NOT EXISTS sync_digests (
+    scope VARCHAR(10) NOT NULL,       -- series / output
+    name VARCHAR(100) NOT NULL,       -- 序列 key（Y、B0…）或输出名（crush_margins、futures_price:Y…）
+    period VARCHAR(10) NOT NULL,      -- 2024-01、2024Q1、2024 或 *
+    digest VARCHAR(32) NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY(scope, name, period)
+);
+
 -- 创建索引加速查询
 CREATE INDEX IF NOT EXISTS idx_futures_price_symbol_date ON futures_price(symbol, trade_date DESC);
 CREATE INDEX IF NOT EXISTS idx_basis_data_variety_date ON basis_data(variety, trade_date DESC);
 CREATE INDEX IF NOT EXISTS idx_position_data_contract_date ON position_data(contract, trade_date DESC);
+CREATE INDEX IF NOT EXISTS idx_spread_data_name_date ON spread_data(name, trade_date DESC);
+CREATE INDEX IF NOT EXISTS idx_margin_stats_metric_date ON margin_stats(metric, trade_date DESC);
 
 -- 启用行级安全（RLS）
 ALTER TABLE futures_price ENABLE ROW LEVEL SECURITY;
 ALTER TABLE basis_data ENABLE ROW LEVEL SECURITY;
 ALTER TABLE position_data ENABLE ROW LEVEL SECURITY;
+ALTER TABLE spread_data ENABLE ROW LEVEL SECURITY;
+ALTER TABLE margin_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE sync_digests ENABLE ROW LEVEL SECURITY;
 
 -- 创建公共读取策略（所有人可读）
 CREATE POLICY "Public read access" ON futures_price FOR SELECT USING (true);
 CREATE POLICY "Public read access" ON basis_data FOR SELECT USING (true);
 CREATE POLICY "Public read access" ON position_data FOR SELECT USING (true);
+CREATE POLICY "Public read access" ON spread_data FOR SELECT USING (true);
+CREATE POLICY "Public read access" ON margin_stats FOR SELECT USING (true);
 
 -- 创建服务角色写入策略（只有服务角色可写）
 CREATE POLICY "Service write access" ON futures_price FOR ALL USING (auth.role() = 'service_role');
 CREATE POLICY "Service write access" ON basis_data FOR ALL USING (auth.role() = 'service_role');
 CREATE POLICY "Service write access" ON position_data FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service write access" ON spread_data FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service write access" ON margin_stats FOR ALL USING (auth.role() = 'service_role');
+CREATE POLICY "Service write access" ON sync_digests FOR ALL USING (auth.role() = 'service_role');
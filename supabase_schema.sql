@@ -9,9 +9,14 @@ create table public.crush_margins (
   gross_margin numeric,
   futures_margin numeric,
   oil_meal_ratio numeric,
+  -- true when the row was computed from a last-known-good (cached) input series
+  is_stale boolean not null default false,
   updated_at timestamp with time zone default now()
 );
 
+-- Existing deployments: add the stale marker in place
+alter table public.crush_margins add column if not exists is_stale boolean not null default false;
+
 -- Enable Row Level Security (RLS)
 alter table public.crush_margins enable row level security;
 